@@ -86,6 +86,33 @@ parser.add_argument(
     help="Drop into slow-mo while a key is held.",
     default=False
 )
+parser.add_argument(
+    '--gpu-water',
+    action='store_true',
+    help="Simulate water ripples on the GPU.",
+    default=False
+)
+parser.add_argument(
+    '--record',
+    metavar='DIR',
+    help="Save a recording of each attempt at a level into DIR.",
+    default=None
+)
+
+parser.add_argument(
+    '--video',
+    metavar='PATH',
+    help="Record every frame as video to PATH (such as a .mp4 file, which "
+         "needs ffmpeg), or as PNGs in PATH if it has no extension.",
+    default=None
+)
+parser.add_argument(
+    '--dynamic-resolution',
+    action='store_true',
+    help="Lower the resolution the scene is drawn at when the GPU can't "
+         "keep up.",
+    default=False
+)
 
 args = parser.parse_args()
 
@@ -93,4 +120,11 @@ import wtf
 wtf.PIXEL_SCALE *= args.pixel_scale
 
 import wtf.main
-wtf.main.run(args.levelname, slowmo=args.easy)
+wtf.main.run(
+    args.levelname,
+    slowmo=args.easy,
+    gpu_water=args.gpu_water,
+    record_dir=args.record,
+    video_path=args.video,
+    dynamic_resolution=args.dynamic_resolution,
+)
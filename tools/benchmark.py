@@ -0,0 +1,339 @@
+"""Benchmark the hot paths of the engine.
+
+Results are printed and can be saved as JSON. Given a baseline saved by an
+earlier run, the benchmarks are compared against it, and the run fails if
+any has slowed down by more than the threshold.
+
+The water render benchmark needs a standalone GL context, created with
+the given --backend, and is skipped if one can't be created.
+
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from xml.etree.ElementTree import fromstring
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import wtf.sim  # noqa: E402: switch to headless mode
+import pymunk  # noqa: E402
+import pyglet.clock  # noqa: E402
+from wtf import ASSETS_PATH  # noqa: E402
+from wtf.physics import space, box  # noqa: E402
+from wtf.water import Water, WaterBatch  # noqa: E402
+from wtf.poly import RockPoly  # noqa: E402
+from wtf.level import Level  # noqa: E402
+from wtf.level_loader import get_compiled, split  # noqa: E402
+from wtf.level_compiler import SVG_NS  # noqa: E402
+from wtf.svg_path import parse_path  # noqa: E402
+
+
+LEVELS = sorted(f.stem for f in ASSETS_PATH.glob('levels/*.svg'))
+
+# Registered benchmark generators, in the order they run
+BENCHMARKS = []
+
+# The moderngl standalone backend to render with, if not the default
+gl_backend = None
+
+
+class SkipBenchmark(Exception):
+    """Raised by a setup function if its benchmark can't run here."""
+
+
+def benchmark(func):
+    """Register a function that yields (name, setup) pairs.
+
+    Each setup function prepares a benchmark and returns the function to
+    time, and optionally a function to clean up afterwards. It raises
+    SkipBenchmark if the benchmark can't run.
+
+    """
+    BENCHMARKS.append(func)
+    return func
+
+
+def timeit(func, min_time, repeat):
+    """Return the median and best time of a call to func, in seconds."""
+    func()  # warm up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat:
+            break
+        number *= 2
+
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return statistics.median(times), min(times)
+
+
+@benchmark
+def parse_paths():
+    """Parse every rock path in the shipped levels."""
+    paths = []
+    for name in LEVELS:
+        root = fromstring((ASSETS_PATH / f'levels/{name}.svg').read_bytes())
+        paths.extend(p.attrib['d'] for p in root.findall(f'.//{SVG_NS}path'))
+
+    def setup():
+        return lambda: [parse_path(p) for p in paths]
+    yield 'parse_path/all', setup
+
+
+@benchmark
+def load_levels():
+    """Load each shipped level, from the compiled level cache."""
+    for name in LEVELS:
+        def setup(name=name):
+            level = Level(clock=pyglet.clock.Clock())
+            return lambda: level.load(name), level.delete
+        yield f'load_level/{name}', setup
+
+
+@benchmark
+def rock_polys():
+    """Construct the rocks of each shipped level."""
+    for name in LEVELS:
+        def setup(name=name):
+            data = get_compiled(name)
+            verts = split(data['poly_verts'], data['poly_vert_counts'] * 2)
+            indexes = split(
+                data['poly_indexes'], data['poly_index_counts']
+            )
+            collision_verts = split(
+                data['collision_verts'], data['collision_vert_counts'] * 2
+            )
+            hulls = split(data['hull_indexes'], data['hull_vert_counts'])
+            polys = []
+            for v, idx, cv, count in zip(
+                    verts, indexes, collision_verts,
+                    data['poly_hull_counts']):
+                polys.append((v, idx, cv, hulls[:count]))
+                hulls = hulls[count:]
+
+            def build():
+                for v, idx, cv, poly_hulls in polys:
+                    RockPoly(
+                        v, indexes=idx, collision_verts=cv, hulls=poly_hulls
+                    ).delete()
+            return build
+        yield f'rockpoly/{name}', setup
+
+
+@benchmark
+def water_steps():
+    """Step rippling water of various widths and subdivisions."""
+    for subdiv in (5, 10):
+        for width in (10, 25, 50):
+            def setup(width=width, subdiv=subdiv):
+                default, Water.SUBDIV = Water.SUBDIV, subdiv
+                w = Water(10, 0, width)
+                Water.SUBDIV = default
+                w.drip(None)
+
+                def step():
+                    w.awake = True
+                    Water.update_all(1 / 60)
+                return step, w.delete
+            yield f'water_step/w{width}/subdiv{subdiv}', setup
+
+
+@benchmark
+def buoyancy():
+    """Apply buoyancy to bodies floating in the water."""
+    for count in (1, 10, 50):
+        def setup(count=count):
+            w = Water(10, 0, 100)
+            shapes = []
+            for i in range(count):
+                body = pymunk.Body(1, pymunk.inf)
+                body.position = (i * 100 / count, 9.5)
+                shape = box(body, 0, 0, 1, 1)
+                space.add(body, shape)
+                shapes.append(shape)
+            space.step(1 / 180)  # find the contacts
+
+            def cleanup():
+                for shape in shapes:
+                    space.remove(shape.body, shape)
+                w.delete()
+            return lambda: Water.apply_buoyancy(1 / 180), cleanup
+        yield f'buoyancy/{count}', setup
+
+
+@benchmark
+def water_render():
+    """Upload and draw the water vertices."""
+    import moderngl
+    from pyrr import Matrix44
+    mgl = None
+    for width in (25, 100):
+        def setup(width=width):
+            nonlocal mgl
+            if mgl is None:
+                kwargs = {'backend': gl_backend} if gl_backend else {}
+                try:
+                    mgl = moderngl.create_standalone_context(**kwargs)
+                except Exception as e:
+                    raise SkipBenchmark(
+                        f"no standalone GL context ({e})"
+                    ) from None
+            fbo = mgl.simple_framebuffer((800, 600))
+            fbo.use()
+            batch = WaterBatch(mgl)
+            w = Water(10, 0, width)
+            mvp = Matrix44.orthogonal_projection(
+                0, 25, 0, 19, -1, 1, dtype='f4'
+            )
+
+            def render():
+                w.redraw = True
+                batch.render(1 / 60, mvp)
+                mgl.finish()
+
+            def cleanup():
+                w.delete()
+                fbo.release()
+            return render, cleanup
+        yield f'water_render/w{width}', setup
+
+
+@benchmark
+def simulate():
+    """Simulate a second of play of each shipped level."""
+    for name in LEVELS:
+        def setup(name=name):
+            sim = wtf.sim.Simulation(name)
+            steps = round(1 / sim.STEP)
+
+            def run():
+                for _ in range(steps):
+                    sim.step()
+            return run, sim.delete
+        yield f'simulate/{name}', setup
+
+
+def run_benchmarks(pattern, min_time, repeat):
+    """Run the benchmarks whose name contains pattern."""
+    results = {}
+    for bench in BENCHMARKS:
+        for name, setup in bench():
+            if pattern not in name:
+                continue
+            try:
+                funcs = setup()
+            except SkipBenchmark as e:
+                print(f"Skipping {name}: {e}")
+                continue
+            if callable(funcs):
+                funcs = funcs, None
+            func, cleanup = funcs
+            try:
+                median, best = timeit(func, min_time, repeat)
+            finally:
+                if cleanup:
+                    cleanup()
+            results[name] = {'median': median, 'min': best}
+            print(
+                f"{name:<36} {median * 1e3:10.4f}ms  "
+                f"(min {best * 1e3:.4f}ms)"
+            )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print changes against the baseline; return the names that regressed.
+
+    A benchmark has regressed if its median time has grown by more than
+    the fraction threshold.
+
+    """
+    regressed = []
+    for name, result in results.items():
+        try:
+            before = baseline[name]['median']
+        except KeyError:
+            continue
+        change = result['median'] / before - 1
+        flag = ''
+        if change > threshold:
+            regressed.append(name)
+            flag = '  REGRESSED'
+        print(f"{name:<36} {change:+8.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'pattern',
+        nargs='?',
+        default='',
+        help="Only run benchmarks whose name contains this."
+    )
+    parser.add_argument(
+        '--save',
+        metavar='PATH',
+        help="Save the results as JSON."
+    )
+    parser.add_argument(
+        '--baseline',
+        metavar='PATH',
+        help="Compare against results saved by an earlier run."
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help="Fail if a benchmark is slower than the baseline by more "
+             "than this fraction (default 0.1)."
+    )
+    parser.add_argument(
+        '--min-time',
+        type=float,
+        default=0.5,
+        help="Seconds to spend timing each benchmark."
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help="Number of timings to take the median of."
+    )
+    parser.add_argument(
+        '--backend',
+        help="The moderngl standalone backend, eg. 'egl'."
+    )
+    args = parser.parse_args()
+
+    global gl_backend
+    gl_backend = args.backend
+
+    results = run_benchmarks(args.pattern, args.min_time, args.repeat)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        print(f"\nCompared to {args.baseline}:")
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            sys.exit(
+                f"{len(regressed)} benchmarks regressed by more than "
+                f"{args.threshold:.0%}: {', '.join(regressed)}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Pack the sprite, UI, card and level thumbnail images into atlas pages.
+
+The pages are written to assets/atlas, along with a manifest giving the
+page and region of each image. When the manifest exists, the game loads
+those images as regions of the atlas pages, so that sprites drawn in the
+same batch share a texture.
+
+Run this again whenever any of the packed images change.
+
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import pygame
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wtf import ASSETS_PATH  # noqa: E402
+
+
+GROUPS = ['sprites', 'ui', 'cards', 'levelthumbs']
+
+ATLAS_DIR = ASSETS_PATH / 'atlas'
+
+# Space between images; the edge pixels of each image are extruded into
+# it, so that filtering doesn't bleed neighbouring images into each other
+PADDING = 2
+
+
+def pack(sizes, page_size):
+    """Pack rectangles into pages, using shelves sorted by height.
+
+    sizes is a dict of (width, height) by key. Return a dict of
+    (page, x, y) by key, with y measured downwards, and the number of
+    pages.
+
+    """
+    placements = {}
+    page = 0
+    x = y = PADDING
+    shelf_height = 0
+    for key in sorted(sizes, key=lambda k: (-sizes[k][1], k)):
+        w, h = sizes[key]
+        if w + 2 * PADDING > page_size or h + 2 * PADDING > page_size:
+            raise ValueError(f"{key} ({w}x{h}) is too large for a page")
+        if x + w + PADDING > page_size:
+            # Start a new shelf
+            x = PADDING
+            y += shelf_height + PADDING
+            shelf_height = 0
+        if y + h + PADDING > page_size:
+            page += 1
+            x = y = PADDING
+            shelf_height = 0
+        placements[key] = page, x, y
+        x += w + PADDING
+        shelf_height = max(shelf_height, h)
+    return placements, page + 1
+
+
+def blit_extruded(page, img, x, y):
+    """Draw img onto page at (x, y), extruding its edges by a pixel."""
+    w, h = img.get_size()
+    page.blit(img, (x - 1, y), pygame.Rect(0, 0, 1, h))
+    page.blit(img, (x + w, y), pygame.Rect(w - 1, 0, 1, h))
+    page.blit(img, (x, y - 1), pygame.Rect(0, 0, w, 1))
+    page.blit(img, (x, y + h), pygame.Rect(0, h - 1, w, 1))
+    page.blit(img, (x, y))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=2048,
+        help="The width and height of each atlas page, in pixels."
+    )
+    args = parser.parse_args()
+
+    images = {}
+    for group in GROUPS:
+        for f in sorted((ASSETS_PATH / group).iterdir()):
+            if f.suffix in ('.png', '.jpg'):
+                key = f'{group}/{f.name}'
+                images[key] = pygame.image.load(str(f))
+    sizes = {k: img.get_size() for k, img in images.items()}
+    placements, num_pages = pack(sizes, args.page_size)
+
+    pages = [
+        pygame.Surface((args.page_size, args.page_size), pygame.SRCALPHA)
+        for _ in range(num_pages)
+    ]
+    for page in pages:
+        page.fill((0, 0, 0, 0))
+
+    manifest = {'pages': [], 'regions': {}}
+    for key, (page, x, y) in placements.items():
+        w, h = sizes[key]
+        blit_extruded(pages[page], images[key], x, y)
+        # Regions are in GL coordinates, measured up from the bottom
+        manifest['regions'][key] = {
+            'page': page,
+            'x': x,
+            'y': args.page_size - y - h,
+            'width': w,
+            'height': h,
+        }
+
+    ATLAS_DIR.mkdir(exist_ok=True)
+    for i, page in enumerate(pages):
+        name = f'page{i}.png'
+        pygame.image.save(page, str(ATLAS_DIR / name))
+        manifest['pages'].append(f'atlas/{name}')
+    (ATLAS_DIR / 'manifest.json').write_text(json.dumps(manifest, indent=1))
+    print(f"Packed {len(images)} images into {num_pages} atlas pages")
+
+
+if __name__ == '__main__':
+    main()
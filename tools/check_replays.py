@@ -0,0 +1,111 @@
+"""Check that recordings replay exactly, however many levels ran before.
+
+For each level, runs with random jumps are recorded, each on the Nth load
+of a Simulation that has already played N - 1 other runs. Each recording is
+then replayed in the same process, on yet another load, and in a fresh
+process, on the first load; both replays must match it at every step.
+Whether an ordering bug shows depends on the jumps, so each level is
+recorded several times.
+
+"""
+import sys
+import random
+import argparse
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wtf.sim import Simulation  # noqa: E402: switch to headless mode
+from wtf import ASSETS_PATH  # noqa: E402
+from wtf.directions import Direction  # noqa: E402
+from wtf.replay import Recording, replay  # noqa: E402
+
+
+# Jumps made in each run, and the range of seconds between them
+JUMPS = 6
+INTERVAL = 0.3, 1.5
+
+
+def play(sim, level_name, rng, recording=None):
+    """Play a level in sim with random jumps, until it finishes."""
+    sim.load(level_name)
+    sim.record(recording)
+    for _ in range(JUMPS):
+        sim.run(rng.uniform(*INTERVAL))
+        sim.jump(rng.choice(list(Direction)))
+    sim.run_until_done(max_seconds=10)
+    sim.record(None)
+
+
+def replay_fresh(recording):
+    """Replay a recording in a new Simulation; run in a fresh process."""
+    return replay(recording, Simulation())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'levels',
+        nargs='*',
+        help="Levels to check; defaults to all levels."
+    )
+    parser.add_argument(
+        '--loads',
+        type=int,
+        default=3,
+        help="The load on which each recording is made."
+    )
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=3,
+        help="The number of recordings to make of each level."
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help="Seed for the random jumps."
+    )
+    args = parser.parse_args()
+
+    levels = args.levels or sorted(
+        f.stem for f in ASSETS_PATH.glob('levels/*.svg')
+    )
+    rng = random.Random(args.seed)
+    sim = Simulation()
+    recordings = []
+    for name in levels * args.runs:
+        for _ in range(args.loads - 1):
+            play(sim, rng.choice(levels), rng)
+        rec = Recording(name)
+        play(sim, name, rng, rec)
+        recordings.append(rec)
+
+    # Spawn a new process for each replay, rather than forking this one
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(maxtasksperchild=1) as pool:
+        fresh = pool.map(replay_fresh, recordings, chunksize=1)
+
+    failures = 0
+    for rec, fresh_step in zip(recordings, fresh):
+        for where, step in [
+                ('same process', replay(rec, sim)),
+                ('fresh process', fresh_step)]:
+            if step is not None:
+                failures += 1
+                print(
+                    f"{rec.level_name}: replay in the {where} diverged at "
+                    f"step {step} of {rec.steps}"
+                )
+    if failures:
+        sys.exit(f"{failures} replays diverged.")
+    print(
+        f"{len(recordings)} recordings made on load {args.loads} "
+        f"replayed exactly."
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Check that the SVG path parser handles each form of the path grammar.
+
+Each path in CASES is parsed and its vertices compared with the expected
+ones. Curves and arcs are flattened, so for those only the vertex count
+is bounded and the end points are checked.
+
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wtf.svg_path import parse_path  # noqa: E402
+
+
+SQUARE = [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+# (path, expected vertices of each subpath)
+CASES = [
+    ('M0 0 L10 0 L10 10 L0 10 Z', [SQUARE]),
+    ('M0,0 10,0 10,10 0,10z', [SQUARE]),
+    ('m0 0 10 0 0 10 -10 0z', [SQUARE]),
+    ('M 0 0 H 10 V 10 H 0 Z', [SQUARE]),
+    ('M0 0h10v10h-10z', [SQUARE]),
+    ('M0-0L10-0 10,10L0,10', [SQUARE]),
+    ('M0 0 L1e1 0 L10 1E1 L.0 10 z', [SQUARE]),
+    ('M0 0 L10 0 Z M20 0 L30 0 Z', [[[0, 0], [10, 0]], [[20, 0], [30, 0]]]),
+]
+
+# (path, start, end) of paths with curves or arcs in them
+CURVES = [
+    ('M0 0 C0 10 10 10 10 0', (0, 0), (10, 0)),
+    ('M0 0 c0,10 10,10 10,0 s10,-10 10,0', (0, 0), (20, 0)),
+    ('M0 0 Q5 10 10 0 T20 0', (0, 0), (20, 0)),
+    ('M0 0 A5 5 0 0 1 10 0', (0, 0), (10, 0)),
+    ('M0 0 A 5 5 0 0 1 10 0', (0, 0), (10, 0)),
+    ('M0 0 A 5,5 0 0,1 10,0', (0, 0), (10, 0)),
+    ('M0 0 A 5 , 5 , 0 , 0 , 1 , 10 , 0', (0, 0), (10, 0)),
+    ('M0 0 a5,5 0 0110,0', (0, 0), (10, 0)),
+    ('M0 0 A 5 5 0 0 1 10 0 5 5 0 0 1 20 0', (0, 0), (20, 0)),
+]
+
+INVALID = [
+    'M0 0 L10',
+    'M0 0 Z1',
+    'M0 0 A5 5 0 2 1 10 0',
+    'M0 0 X10 10',
+]
+
+
+def main():
+    failures = []
+    for path, expected in CASES:
+        try:
+            subpaths = parse_path(path)
+        except ValueError as e:
+            failures.append(f"{path!r}: {e}")
+            continue
+        if len(subpaths) != len(expected) or not all(
+                np.allclose(s, e) for s, e in zip(subpaths, expected)):
+            failures.append(f"{path!r}: parsed as {subpaths}")
+
+    for path, start, end in CURVES:
+        try:
+            subpaths = parse_path(path)
+        except ValueError as e:
+            failures.append(f"{path!r}: {e}")
+            continue
+        verts = subpaths[0]
+        if len(subpaths) != 1 or len(verts) < 3 or \
+                not np.allclose(verts[0], start) or \
+                not np.allclose(verts[-1], end):
+            failures.append(f"{path!r}: parsed as {subpaths}")
+
+    for path in INVALID:
+        try:
+            parse_path(path)
+        except ValueError:
+            continue
+        failures.append(f"{path!r}: parsed, but is invalid")
+
+    for failure in failures:
+        print(failure)
+    total = len(CASES) + len(CURVES) + len(INVALID)
+    if failures:
+        sys.exit(f"{len(failures)} of {total} path checks failed.")
+    print(f"All {total} path checks passed.")
+
+
+if __name__ == '__main__':
+    main()
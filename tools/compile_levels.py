@@ -0,0 +1,56 @@
+"""Compile all levels into the level cache.
+
+The game compiles levels on demand, but this lets the cost of doing so be
+paid ahead of time (and checks that all levels compile). For each level we
+report how many vertices simplifying the rock outlines removed, and how many
+static shapes the rocks need once the triangles of their collision outlines
+have been merged into convex pieces. Levels that are already up to date are
+reported from the cache.
+
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wtf import ASSETS_PATH  # noqa: E402
+from wtf.level_compiler import (  # noqa: E402
+    compile_level, read_compiled, write_compiled
+)
+
+
+def report(data):
+    """Describe the contents of a compiled level."""
+    tris = data['collision_tri_counts'].sum()
+    hulls = data['poly_hull_counts'].sum()
+    source = int(data['source_vert_count'])
+    drawn = data['poly_vert_counts'].sum()
+    collision = data['collision_vert_counts'].sum()
+    return (
+        f"{len(data['poly_vert_counts'])} polys, "
+        f"{len(data['water'])} water, "
+        f"{len(data['entity_name'])} entities; "
+        f"rock vertices {source} -> {drawn} drawn "
+        f"({source - drawn} removed), {collision} for collision "
+        f"({source - collision} removed); "
+        f"rock shapes {tris} -> {hulls} after convex merging"
+    )
+
+
+def main():
+    for f in sorted(ASSETS_PATH.glob('levels/*.svg')):
+        src = f.read_bytes()
+        data = read_compiled(f.stem, src)
+        if data is not None:
+            print(f"{f.stem} (up to date): {report(data)}")
+            continue
+        start = time.perf_counter()
+        data = compile_level(src)
+        write_compiled(f.stem, data)
+        elapsed = time.perf_counter() - start
+        print(f"{f.stem} (compiled in {elapsed:.3f}s): {report(data)}")
+
+
+if __name__ == '__main__':
+    main()
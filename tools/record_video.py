@@ -0,0 +1,77 @@
+"""Render a recorded play session to video, faster than real time.
+
+Recordings are made by the game with --record, or by wtf.sim with
+--record. The jumps are replayed in a Simulation at the physics steps
+they were recorded at, just as wtf.replay checks them, and a frame is
+drawn offscreen every FRAME_STEPS steps, for 60 frames per second of play.
+Frames are captured and encoded as in the game's --video mode.
+
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+from collections import deque
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import wtf  # noqa: E402
+wtf.use_dummy_audio()
+
+from wtf.simulation import Simulation, STEP, FRAME_STEPS  # noqa: E402
+from wtf.render import LevelRenderer  # noqa: E402
+from wtf.replay import Recording  # noqa: E402
+from wtf.video import VideoCapture, VideoWriter  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording', help="The recording file to render.")
+    parser.add_argument(
+        'output',
+        help="The video file to write (which needs ffmpeg), or a directory "
+             "to write PNGs into."
+    )
+    parser.add_argument(
+        '--tail',
+        type=float,
+        default=1.0,
+        help="Seconds to keep rendering after the end of the recording."
+    )
+    args = parser.parse_args()
+
+    rec = Recording.load(args.recording)
+    sim = Simulation()
+    renderer = LevelRenderer(sim.level)
+    sim.load(rec.level_name)
+    renderer.set_background(rec.level_name)
+
+    fps = round(1 / (STEP * FRAME_STEPS))
+    capture = VideoCapture(
+        renderer.mgl,
+        renderer.output,
+        renderer.size,
+        VideoWriter(args.output, renderer.size, fps=fps),
+    )
+
+    start = time.perf_counter()
+    jumps = deque(rec.jumps)
+    total = rec.steps + round(args.tail / STEP)
+    for step in range(total):
+        while jumps and jumps[0][0] == step:
+            sim.jump(jumps.popleft()[1])
+        sim.step()
+        if sim.steps % FRAME_STEPS == 0:
+            renderer.draw(STEP * FRAME_STEPS)
+            capture.end_frame()
+    capture.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Rendered {capture.frame} frames of {rec.level_name} "
+        f"in {elapsed:.1f}s ({total * STEP / elapsed:.1f}x real time)"
+    )
+
+
+if __name__ == '__main__':
+    main()
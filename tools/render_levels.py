@@ -0,0 +1,162 @@
+"""Render a picture and a thumbnail of each level.
+
+Each level is loaded and left to run for a moment in a Simulation, then
+rendered offscreen as it would appear in the game (without the HUD). The
+picture is written to assets/levelpics and a thumbnail for the level
+select to assets/levelthumbs. Levels are rendered in parallel, in a pool
+of worker processes that each have their own GL context.
+
+Pictures are only rebuilt for levels whose SVG source, or any of the assets
+that appear in them, have changed since the last run; the hashes of those
+assets are kept in a manifest alongside the thumbnails.
+
+"""
+import sys
+import json
+import hashlib
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import wtf  # noqa: E402
+wtf.use_dummy_audio()
+
+import pygame  # noqa: E402
+
+from wtf import ASSETS_PATH  # noqa: E402
+from wtf.simulation import Simulation  # noqa: E402
+from wtf.render import LevelRenderer  # noqa: E402
+from wtf.level_compiler import load_compiled  # noqa: E402
+
+
+PICTURE_DIR = ASSETS_PATH / 'levelpics'
+THUMBNAIL_DIR = ASSETS_PATH / 'levelthumbs'
+THUMBNAIL_WIDTH = 120
+
+# Hashes of the assets each picture was rendered from, by level name
+MANIFEST_PATH = THUMBNAIL_DIR / 'manifest.json'
+
+# How long to run each level before taking its picture, in seconds
+SETTLE_TIME = 0.3
+
+# Assets that appear in every level: the actors' sprites, and the rocks
+COMMON_ASSETS = ['sprites/*', 'textures/rock.jpg']
+
+
+def level_assets(name):
+    """Return the paths of the assets that appear in a level."""
+    src = (ASSETS_PATH / f'levels/{name}.svg').read_bytes()
+    data = load_compiled(name, src)
+    paths = [ASSETS_PATH / f'levels/{name}.svg']
+
+    background = ASSETS_PATH / f'backgrounds/{name}.jpg'
+    if not background.exists():
+        background = ASSETS_PATH / 'backgrounds/default.jpg'
+    paths.append(background)
+
+    for group, filename in zip(data['entity_group'], data['entity_name']):
+        if group == 'scenery':
+            stem = str(filename).rsplit('.', 1)[0]
+            paths.extend(sorted(ASSETS_PATH.glob(f'scenery/{stem}.*')))
+    for pattern in COMMON_ASSETS:
+        paths.extend(sorted(ASSETS_PATH.glob(pattern)))
+    return paths
+
+
+def assets_hash(name):
+    """Return a hash of the contents of the assets that appear in a level."""
+    h = hashlib.sha1()
+    for path in level_assets(name):
+        h.update(str(path.relative_to(ASSETS_PATH)).encode())
+        h.update(hashlib.sha1(path.read_bytes()).digest())
+    return h.hexdigest()
+
+
+# The simulation and renderer of each worker process
+sim = renderer = None
+
+
+def init_worker():
+    global sim, renderer
+    sim = Simulation()
+    renderer = LevelRenderer(sim.level)
+
+
+def render_level(name):
+    """Render the picture and thumbnail of a level; run in the workers."""
+    sim.load(name)
+    renderer.set_background(name)
+    sim.run(SETTLE_TIME)
+
+    renderer.draw()
+    w, h = renderer.size
+    picture = pygame.transform.flip(
+        pygame.image.frombuffer(renderer.read(), (w, h), 'RGB'), False, True
+    )
+    thumbnail = pygame.transform.smoothscale(
+        picture, (THUMBNAIL_WIDTH, round(h * THUMBNAIL_WIDTH / w))
+    )
+    pygame.image.save(picture, str(PICTURE_DIR / f'{name}.png'))
+    pygame.image.save(thumbnail, str(THUMBNAIL_DIR / f'{name}.jpg'))
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'levels',
+        nargs='*',
+        help="Levels to render; defaults to all levels."
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help="Render the levels even if they haven't changed."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help="Processes to render with; defaults to the number of cores."
+    )
+    args = parser.parse_args()
+
+    levels = args.levels or sorted(
+        f.stem for f in ASSETS_PATH.glob('levels/*.svg')
+    )
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text())
+    except (OSError, ValueError):
+        manifest = {}
+
+    hashes = {name: assets_hash(name) for name in levels}
+    stale = [
+        name for name in levels
+        if args.force or manifest.get(name) != hashes[name]
+    ]
+    for name in sorted(set(levels) - set(stale)):
+        print(f"{name}: up to date")
+    if not stale:
+        return
+
+    PICTURE_DIR.mkdir(exist_ok=True)
+    THUMBNAIL_DIR.mkdir(exist_ok=True)
+
+    # Spawn rather than fork, so that no worker inherits a GL context
+    with ProcessPoolExecutor(
+            args.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker) as pool:
+        futures = [pool.submit(render_level, name) for name in stale]
+        for future in as_completed(futures):
+            name = future.result()
+            manifest[name] = hashes[name]
+            MANIFEST_PATH.write_text(json.dumps(manifest, indent=1))
+            print(f"{name}: rendered")
+
+
+if __name__ == '__main__':
+    main()
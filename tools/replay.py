@@ -0,0 +1,41 @@
+"""Replay a recorded play session headlessly, checking for divergence.
+
+Recordings are made by the game with --record, or by wtf.sim with
+--record. The replay fails at the first physics step whose state differs
+from the recording.
+
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import wtf.sim  # noqa: E402: switch to headless mode
+from wtf.replay import Recording, replay  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording', help="The recording file to replay.")
+    args = parser.parse_args()
+
+    rec = Recording.load(args.recording)
+    mode = 'easy' if rec.easy else 'normal'
+    print(
+        f"{rec.level_name} ({mode}): "
+        f"{len(rec.jumps)} jumps over {rec.steps} steps"
+    )
+
+    start = time.perf_counter()
+    sim = wtf.sim.Simulation()
+    step = replay(rec, sim)
+    elapsed = time.perf_counter() - start
+    if step is not None:
+        sys.exit(f"Replay diverged from the recording at step {step}.")
+    print(f"Replay matched the recording ({elapsed:.3f}s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Find the shortest solutions to each level, for each star rating.
+
+Jump sequences are searched breadth first, so the first solution found for
+each star rating uses the fewest jumps. After each jump the frog is left
+to settle before the next one is made. Each candidate is simulated from the
+start of the level with the headless Simulation, replaying the jumps that
+led to it. Each worker loads every candidate into one Simulation; as a level
+plays out the same however many were loaded before it, the positions the
+search reaches can be reproduced exactly with wtf.sim.
+
+States that differ only slightly (by the frog's quantized position and
+velocity, the flies remaining and the jumps available) are only explored
+once. Candidates are simulated in parallel across all cores.
+
+"""
+import sys
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wtf.sim import Simulation  # noqa: E402: switch to headless mode
+from wtf import ASSETS_PATH  # noqa: E402
+from wtf.actors import Fly  # noqa: E402
+from wtf.directions import Direction  # noqa: E402
+
+
+# Speed below which the frog is considered to have settled
+SETTLE_SPEED = 0.5
+
+# Steps that the frog must stay below SETTLE_SPEED to have settled
+SETTLE_STEPS = 30
+
+# Longest time to wait for the frog to settle, in seconds; a frog bobbing
+# on the water may never come to rest
+MAX_WAIT = 3.0
+
+# Quantization of the frog's position and velocity for detecting states
+# that have been seen before
+POSITION_QUANTUM = 0.5
+VELOCITY_QUANTUM = 2.0
+
+
+class Node:
+    """A state reached by a sequence of jumps, waiting for the next jump.
+
+    jumps is a tuple of (step, direction) pairs. The next jump is made at
+    step, if any of the available directions remain.
+
+    """
+    def __init__(self, jumps, step, available, key, stars=None):
+        self.jumps = jumps
+        self.step = step
+        self.available = available
+        self.key = key
+        self.stars = stars  # the outcome, if the level has finished
+
+
+def state_key(sim):
+    """Return a hashable summary of the state of a simulation."""
+    body = sim.level.pc.body
+    pos = tuple(round(c / POSITION_QUANTUM) for c in body.position)
+    vel = tuple(round(c / VELOCITY_QUANTUM) for c in body.velocity)
+    flies = tuple(sorted(
+        (round(f.pos.x), round(f.pos.y)) for f in Fly.insts
+    ))
+    available = tuple(d for d in Direction if sim.controls.available[d])
+    return pos, vel, flies, available
+
+
+def settle(sim):
+    """Step until the frog comes to rest, or the level finishes."""
+    body = sim.level.pc.body
+    still = 0
+    for _ in range(round(MAX_WAIT / sim.STEP)):
+        if sim.level.won is not None:
+            return
+        sim.step()
+        if body.velocity.length < SETTLE_SPEED:
+            still += 1
+            if still >= SETTLE_STEPS:
+                return
+        else:
+            still = 0
+
+
+# The Simulation of each process, which every candidate is loaded into
+sim = None
+
+
+def simulate(level_name, jumps):
+    """Simulate a sequence of jumps from the start of a level.
+
+    Return a Node for the state once the frog settles after the last jump.
+
+    """
+    global sim
+    if sim is None:
+        sim = Simulation()
+    sim.load(level_name)
+    if not jumps:
+        settle(sim)
+    for step, direction in jumps:
+        while sim.steps < step:
+            sim.step()
+        sim.jump(direction)
+        settle(sim)
+
+    available = tuple(
+        d for d in Direction if sim.controls.available[d]
+    )
+    stars = None
+    if sim.level.won is not None or not available or not Fly.insts:
+        # Either all the flies are caught, or we're out of jumps and
+        # the level will fail (with some stars perhaps)
+        sim.run_until_done()
+        stars = sim.level.stars if sim.level.won else 0
+    return Node(jumps, sim.steps, available, state_key(sim), stars)
+
+
+def expand(level_name, node):
+    """Return the nodes reached by each jump available from node."""
+    return [
+        simulate(level_name, node.jumps + ((node.step, d),))
+        for d in node.available
+    ]
+
+
+def solve(pool, level_name, max_jumps):
+    """Return the shortest jump sequences for a level, by star rating."""
+    root = simulate(level_name, ())
+    seen = {root.key}
+    frontier = [root]
+    solutions = {}
+    for _ in range(max_jumps):
+        if not frontier or 3 in solutions:
+            break
+        results = pool.map(
+            expand,
+            [level_name] * len(frontier),
+            frontier,
+        )
+        frontier = []
+        for children in results:
+            for child in children:
+                if child.stars is not None:
+                    if child.stars and child.stars not in solutions:
+                        solutions[child.stars] = child.jumps
+                    continue
+                if child.key in seen:
+                    continue
+                seen.add(child.key)
+                frontier.append(child)
+    return solutions
+
+
+def describe(jumps):
+    """Format a jump sequence, with the time waited before each jump."""
+    last = 0
+    moves = []
+    for step, direction in jumps:
+        wait = (step - last) * Simulation.STEP
+        moves.append(f'{wait:.2f}s {direction.name}')
+        last = step
+    return ', '.join(moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'levels',
+        nargs='*',
+        help="Levels to solve; defaults to all levels."
+    )
+    parser.add_argument(
+        '--max-jumps',
+        type=int,
+        default=8,
+        help="The longest jump sequence to search."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help="Processes to simulate with; defaults to the number of cores."
+    )
+    args = parser.parse_args()
+
+    levels = args.levels or sorted(
+        f.stem for f in ASSETS_PATH.glob('levels/*.svg')
+    )
+    with ProcessPoolExecutor(args.workers) as pool:
+        for name in levels:
+            solutions = solve(pool, name, args.max_jumps)
+            if not solutions:
+                print(f"{name}: no solution in {args.max_jumps} jumps")
+            for stars in sorted(solutions, reverse=True):
+                jumps = solutions[stars]
+                print(f"{name}: {stars} stars in {len(jumps)} jumps: "
+                      f"{describe(jumps)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 import sys
 import pyglet.resource
 import pathlib
@@ -13,5 +14,22 @@ pyglet.resource.reindex()
 
 PIXEL_SCALE = 0.5  # Scale down for non-hidpi screens
 
+# Run without a window, GL context or audio device. This must be set before
+# any other submodules are imported (see wtf.sim).
+HEADLESS = False
+
 # File where progress is saved
 SAVE_PATH = root / '.save.json'
+
+# Directory where compiled levels are cached
+LEVEL_CACHE_PATH = root / '.levelcache'
+
+
+def use_dummy_audio():
+    """Play sounds to a dummy audio device, for tools that draw the game.
+
+    Importing the game starts the music, so this must be called before any
+    other submodules are imported.
+
+    """
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
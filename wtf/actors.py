@@ -2,18 +2,17 @@ import random
 from math import sin, cos, copysign
 
 from pyglet import gl
-import pyglet.resource
-import pyglet.graphics
 import pyglet.sprite
-import pyglet.image
+import pyglet.graphics
 import pymunk
 from pymunk import Vec2d
 
+from . import HEADLESS
 from .geom import phys_to_screen, SPACE_SCALE
 from .physics import (
-    space, cbox, COLLISION_TYPE_FROG, COLLISION_TYPE_COLLECTIBLE
+    space, cbox, interpolated, COLLISION_TYPE_FROG, COLLISION_TYPE_COLLECTIBLE
 )
-from .sprites import load_centered, center
+from .sprites import Sprite, load_centered, load_grid, load_texture
 from .state import UnderwaterState
 
 
@@ -21,7 +20,7 @@ actor_sprites = pyglet.graphics.Batch()
 
 
 class Tongue:
-    TEX = pyglet.resource.texture('sprites/tongue.png')
+    TEX = load_texture('sprites/tongue.png')
     ordering = pyglet.graphics.OrderedGroup(1)
     group = pyglet.sprite.SpriteGroup(
         TEX,
@@ -80,12 +79,12 @@ class Frog:
     TONGUE_SPEED = 0.2  # seconds
 
     def __init__(self, x, y):
-        self.legs = pyglet.sprite.Sprite(
+        self.legs = Sprite(
             self.LEGS_V,
             batch=actor_sprites,
             group=self.body_group
         )
-        self.sprite = pyglet.sprite.Sprite(
+        self.sprite = Sprite(
             self.SPRITE,
             batch=actor_sprites,
             group=self.body_group
@@ -112,6 +111,9 @@ class Frog:
         self.tongue = None
 
     def lick(self, pos):
+        if HEADLESS:
+            # The tongue is purely cosmetic
+            return
         if self.tongue:
             self.tongue.fly_pos = pos
             self.tongue.length = 0
@@ -125,8 +127,8 @@ class Frog:
         return Vec2d(*self.sprite.position)
 
     def update(self, dt):
-        pos = self.body.position / SPACE_SCALE
-        self.sprite.position = self.legs.position = pos
+        pos, _ = interpolated(self.body)
+        self.sprite.position = self.legs.position = pos / SPACE_SCALE
         vx, vy = self.body.velocity
         angle = self.body.velocity.get_angle_degrees()
         if abs(vy) > abs(vx):
@@ -184,8 +186,7 @@ class SpriteAnim:
 
 class Fly:
     DIMS = (1, 4)
-    SPRITE = pyglet.resource.image('sprites/fly.png')
-    SEQ = center(pyglet.image.ImageGrid(SPRITE, *DIMS).get_texture_sequence())
+    SEQ = load_grid('sprites/fly.png', *DIMS)
     RATE = 0.05
 
     CATCH_RADIUS = 2
@@ -195,7 +196,7 @@ class Fly:
     def __init__(self, x, y):
         self.pos = Vec2d(x + 0.5, y + 0.5)
         self.t = 0
-        self.sprite = pyglet.sprite.Sprite(
+        self.sprite = Sprite(
             self.SEQ[0],
             batch=actor_sprites,
             usage='stream'
@@ -252,8 +253,7 @@ class Fly:
 
 class Butterfly(Fly):
     DIMS = (1, 6)
-    SPRITE = pyglet.resource.image('sprites/butterfly.png')
-    SEQ = center(pyglet.image.ImageGrid(SPRITE, *DIMS).get_texture_sequence())
+    SEQ = load_grid('sprites/butterfly.png', *DIMS)
     RATE = 0.1
 
     COLORS = [
@@ -277,7 +277,7 @@ class Butterfly(Fly):
 
 
 class Fish(Fly):
-    SPRITE = center(pyglet.resource.image('sprites/fish.png'))
+    SPRITE = load_centered('fish')
     SEQ = [SPRITE]
 
     CATCH_RADIUS = 2
@@ -297,7 +297,7 @@ class Fish(Fly):
 
 
 class Goldfish(Fish):
-    SPRITE = center(pyglet.resource.image('sprites/goldfish.png'))
+    SPRITE = load_centered('goldfish')
     SEQ = [SPRITE]
 
     def collect(self, pc, controls):
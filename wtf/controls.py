@@ -0,0 +1,68 @@
+from pymunk.vec2d import Vec2d
+
+from .directions import Direction
+from .state import LevelState, UnderwaterState
+from . import sounds
+
+
+class JumpController:
+    """Control the frog's jumps.
+
+    We track which jumps the frog has available.
+
+    """
+    IMPULSE_SCALE = 26
+    JUMP_IMPULSES = {
+        Direction.UL: Vec2d.unit().rotated_degrees(30) * IMPULSE_SCALE,
+        Direction.U: Vec2d.unit() * IMPULSE_SCALE,
+        Direction.UR: Vec2d.unit().rotated_degrees(-30) * IMPULSE_SCALE,
+        Direction.DL: Vec2d.unit().rotated_degrees(180 - 60) * IMPULSE_SCALE,
+        Direction.D: Vec2d.unit().rotated_degrees(180) * IMPULSE_SCALE,
+        Direction.DR: Vec2d.unit().rotated_degrees(180 + 60) * IMPULSE_SCALE,
+    }
+
+    def __init__(self, level, hud=None):
+        self.level = level
+        self.hud = hud
+        self.available = None
+        self.recording = None  # a wtf.replay.Recording of the jumps made
+        self.reset()
+
+    def reset(self):
+        """Set all directions back to available."""
+        if self.available and not any(self.available.values()):
+            self.level.clock.unschedule(self.level.fail)
+        self.available = dict.fromkeys(Direction, True)
+        if self.hud:
+            for d in Direction:
+                self.hud.set_available(d, True)
+
+    def all_available(self):
+        """return True if all directions are available."""
+        return all(self.available.values())
+
+    def jump(self, direction):
+        """Request a jump in the given direction."""
+        if self.level.state is not LevelState.PLAYING:
+            return
+        if self.recording:
+            self.recording.jump(direction)
+        if self.available[direction]:
+            pc = self.level.pc
+            pc.body.velocity = self.JUMP_IMPULSES[direction]
+            self.available[direction] = False
+            if self.hud:
+                self.hud.set_available(direction, False)
+
+            is_dive = (
+                pc.body.underwater == UnderwaterState.UNDERWATER
+                or pc.body.underwater == UnderwaterState.SURFACE
+                and 'D' in direction.name
+            )
+            sounds.jump(underwater=is_dive)
+            if not any(self.available.values()):
+                self.level.clock.schedule_once(self.level.fail, 1.3)
+        else:
+            sounds.play('no', volume=0.2)
+            if self.hud:
+                self.hud.warn_unavailable(direction)
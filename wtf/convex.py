@@ -0,0 +1,74 @@
+"""Convex decomposition of triangulated polygons.
+
+Each triangle of a rock would otherwise become a separate static shape in
+the physics space. Merging them into convex pieces means fewer shapes in
+the broadphase and fewer contacts generated at the seams between them.
+
+"""
+import numpy as np
+
+
+def cross(o, a, b):
+    """Return the z component of the cross product of oa and ob."""
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def merge_convex(verts, indexes, eps=1e-9):
+    """Merge a triangulation into convex polygons.
+
+    This is the Hertel-Mehlhorn algorithm: remove each diagonal between
+    two pieces if the union of the two is still convex. The result has at
+    most four times as many pieces as the optimal decomposition.
+
+    verts is a flat array of vertex coordinates and indexes is a flat
+    array of triangle indices into it, as returned by earcut. Return a list
+    of convex polygons, each a list of vertex indices in counter-clockwise
+    order.
+
+    """
+    pts = np.asarray(verts, dtype=float).reshape(-1, 2).tolist()
+
+    pieces = {}
+    for i, (a, b, c) in enumerate(np.reshape(indexes, (-1, 3)).tolist()):
+        area = cross(pts[a], pts[b], pts[c])
+        if abs(area) <= eps:
+            continue  # drop degenerate triangles
+        pieces[i] = [a, b, c] if area > 0 else [a, c, b]
+
+    # Map each directed edge to the piece it belongs to. Diagonals are the
+    # edges that also appear reversed, in a neighbouring piece.
+    edges = {}
+    for pid, piece in pieces.items():
+        for u, v in zip(piece, piece[1:] + piece[:1]):
+            edges[u, v] = pid
+
+    for u, v in list(edges):
+        p = edges.get((u, v))
+        q = edges.get((v, u))
+        if p is None or q is None or p == q:
+            continue
+
+        # Rotate p to run from v to u and q to run from u to v; the merged
+        # piece is then p followed by the interior of q.
+        pp = pieces[p]
+        i = pp.index(v)
+        pp = pp[i:] + pp[:i]
+        qq = pieces[q]
+        i = qq.index(u)
+        qq = qq[i:] + qq[:i]
+
+        # Only the angles at the ends of the diagonal change
+        if cross(pts[pp[-2]], pts[u], pts[qq[1]]) < -eps:
+            continue
+        if cross(pts[qq[-2]], pts[v], pts[pp[1]]) < -eps:
+            continue
+
+        merged = pp + qq[1:-1]
+        del edges[u, v]
+        del edges[v, u]
+        for a, b in zip(qq, qq[1:]):
+            edges[a, b] = p
+        pieces[p] = merged
+        del pieces[q]
+
+    return list(pieces.values())
@@ -4,6 +4,9 @@ from pymunk import Vec2d
 # Space units are 64 screen pixels
 SPACE_SCALE = 1 / 64
 
+WIDTH = 1600   # Width in hidpi pixels
+HEIGHT = 1200  # Height in hidpi pixels
+
 
 def phys_to_screen(v, v2=None):
     if v2:
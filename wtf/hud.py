@@ -2,8 +2,10 @@ import pyglet.resource
 import pyglet.graphics
 import pyglet.sprite
 
+from . import ASSETS_PATH
 from .directions import Direction
 from .sprites import load_centered
+from .scheduler import defer
 
 # Distance that the jump markers are inset from the edge
 INSET = 40
@@ -26,6 +28,10 @@ class HUD:
         self.height = height
         self.card = None
 
+        # Load the cards ahead of time, so that showing one doesn't stall
+        for f in sorted(ASSETS_PATH.glob('cards/*.png')):
+            defer(load_centered, f.stem, 'cards')
+
         self.batch = pyglet.graphics.Batch()
         self.available = dict.fromkeys(Direction, True)
         self.arrows = {}
@@ -5,7 +5,6 @@ from pyglet.event import EVENT_UNHANDLED, EVENT_HANDLED
 
 from . import main
 from .state import LevelState
-from .screenshot import take_screenshot
 from .directions import Direction, DirectionLR
 
 
@@ -73,7 +72,9 @@ class KeyInputHandler(key.KeyStateHandler):
 
     def default_key_press(self, symbol, modifiers):
         if symbol == key.F12:
-            take_screenshot(self.window)
+            main.screenshots.take()
+        elif symbol == key.F3:
+            main.timing_overlay.toggle()
 
         return super().on_key_press(symbol, modifiers)
 
@@ -0,0 +1,170 @@
+import pyglet.clock
+import pyglet.graphics
+
+from .physics import (
+    space, reset_space, COLLISION_TYPE_FROG, COLLISION_TYPE_COLLECTIBLE,
+    create_walls
+)
+from .state import LevelState
+from .water import Water
+from .geom import WIDTH, HEIGHT
+from .actors import Frog, Fly
+from .controls import JumpController
+from .level_loader import load_level, reload_actors
+from . import sounds
+
+
+class Level:
+    """The rules of the game, as played out in the physics space.
+
+    This is independent of any window, so that it can be shared between the
+    game and the headless simulation. Scheduled events (winning and failing)
+    go through ``clock``, which is the pyglet clock unless another is given.
+
+    """
+    def __init__(self, name=None, hud=None, clock=pyglet.clock):
+        self.state = LevelState.PLAYING
+        self.clock = clock
+        self.pc = None
+        self.objs = []
+        self.actors = []
+        self.static_shapes = []
+        self.compiled = None
+        self.fg_batch = pyglet.graphics.Batch()
+        self.controls = JumpController(self, hud)
+
+        if name:
+            self.load(name)
+
+    def on_collect(self, arbiter, space, data):
+        """Called when a collectible is hit"""
+        fly, frog = arbiter.shapes
+        frog.obj.lick(fly.obj.sprite.position)
+        fly.obj.collect(frog, self.controls)
+        space.remove(fly)
+        self.actors.remove(fly.obj)
+        if not Fly.insts:
+            self.clock.schedule_once(self.win, 0.8)
+
+        sounds.play('lick')
+        return False
+
+    def load(self, level_name):
+        """Load the given level name."""
+        self.name = level_name
+        self.delete()
+        self.create()
+
+    @property
+    def won(self):
+        if self.state == LevelState.PLAYING:
+            return None
+
+        return self.state.value > 2
+
+    @property
+    def stars(self):
+        """The number of stars the level was completed with."""
+        if self.state is LevelState.PERFECT:
+            return 3
+        elif self.state is LevelState.WON:
+            return 3 - len(Fly.insts)
+        return 0
+
+    def win(self, *_):
+        if self.state is not LevelState.PLAYING:
+            return
+        self.state = LevelState.PERFECT
+
+    def fail(self, *_):
+        if self.state is not LevelState.PLAYING:
+            return
+
+        flies_remaining = len(Fly.insts)
+        if flies_remaining in (1, 2):
+            self.state = LevelState.WON
+        else:
+            self.state = LevelState.FAILED
+
+    def new_space(self):
+        """Reset the empty physics space, and add this level's handlers."""
+        reset_space()
+        handler = space.add_collision_handler(
+            COLLISION_TYPE_COLLECTIBLE,
+            COLLISION_TYPE_FROG
+        )
+        handler.begin = self.on_collect
+
+    def create(self):
+        self.pc = None
+        self.objs = []
+        self.actors = []
+        self.new_space()
+        self.static_shapes = create_walls(space, WIDTH, HEIGHT)
+        load_level(self)
+        self.start()
+
+    def start(self):
+        """Begin an attempt at the level, once its actors are created."""
+        self.state = LevelState.PLAYING
+        if self.pc is None:
+            self.pc = Frog(6, 7)
+            self.actors.append(self.pc)
+        self.controls.reset()
+        self.controls.pc = self.pc
+        sounds.play('ribbit')
+
+    def reload(self):
+        """Restart the current level.
+
+        The static geometry, scenery and water bodies are kept; only the
+        actors and the water surfaces are reset. The static shapes are moved
+        into a fresh space in the order they were first added, so that the
+        level plays out exactly as it did when it was loaded.
+
+        """
+        if self.compiled is None:
+            self.delete()
+            self.create()
+            return
+        self.delete_actors()
+        Water.reset_all()
+
+        shapes = space.shapes
+        space.remove(*shapes)
+        for shape in shapes:
+            shape.body = None
+        self.new_space()
+        for shape in shapes:
+            shape.body = space.static_body
+        space.add(*shapes)
+
+        reload_actors(self)
+        self.start()
+
+    def delete_actors(self):
+        # Cancel any pending win or fail from the previous attempt
+        self.clock.unschedule(self.win)
+        self.clock.unschedule(self.fail)
+        for a in self.actors:
+            a.delete()
+        self.actors = []
+        self.pc = None
+
+    def delete(self):
+        self.delete_actors()
+        for o in self.objs:
+            try:
+                o.delete()
+            except KeyError:
+                raise KeyError(f"Couldn't delete {o}")
+        for w in Water.insts[:]:
+            w.delete()
+        self.compiled = None
+        space.remove(*self.static_shapes)
+        self.static_shapes = []
+        self.actors = []
+        self.objs = []
+        self.fg_batch = pyglet.graphics.Batch()
+        assert not space.bodies, f"Space contains bodies: {space.bodies}"
+        assert not space.shapes, f"Space contains shapes: {space.shapes}"
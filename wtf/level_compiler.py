@@ -0,0 +1,312 @@
+"""Compile SVG levels into arrays that can be loaded quickly.
+
+Parsing the SVG and triangulating the rocks is slow, so the result of doing
+so is cached in a .npz file, keyed by a hash of the SVG source. Nothing in
+this module touches pyglet, so levels can be compiled offline (see
+tools/compile_levels.py).
+
+"""
+import os
+import re
+import math
+import hashlib
+from xml.etree.ElementTree import fromstring
+
+import numpy as np
+from earcut.earcut import earcut
+
+from . import LEVEL_CACHE_PATH
+from .geom import SPACE_SCALE
+from .convex import merge_convex
+from .svg_path import parse_path
+from .simplify import simplify_loop
+
+
+# Bump this whenever the compiled format changes
+FORMAT_VERSION = 4
+
+SVG_SCALE = 2 * SPACE_SCALE
+
+# How far simplified rock outlines may stray from the original, in SVG
+# units, and the most vertices each outline may keep. Collision geometry
+# can be much coarser than what is drawn.
+DRAW_TOLERANCE = 0.5
+DRAW_MAX_VERTS = 1000
+COLLISION_TOLERANCE = 2.0
+COLLISION_MAX_VERTS = 250
+
+SVG_NS = '{http://www.w3.org/2000/svg}'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+def parse_fill(style):
+    """Parse the fill color from a style attribute.
+
+    Return a tuple (draw, color).
+
+    """
+    mo = re.search(r'(?:[; ]|^)fill *: *([^;]+)(?:;|$)', style)
+    if mo:
+        fill = mo.group(1)
+    else:
+        fill = 'none'
+    draw = fill and fill != 'none'
+    if fill.startswith('#'):
+        color = int(fill[1:7], 16)
+        color, b = divmod(color, 256)
+        r, g = divmod(color, 256)
+        color = np.array([r, g, b]) / 255
+    else:
+        color = (0.5, 0.4, 0.3)
+    return draw, color
+
+
+def xform_matrix(a, b, c, d, e, f):
+    return np.array([
+        [a, c, e],
+        [b, d, f],
+        [0, 0, 1],
+    ])
+
+
+def xform_scale(x, y=None):
+    if y is None:
+        y = x
+    return np.array([
+        [x, 0, 0],
+        [0, y, 0],
+        [0, 0, 1],
+    ])
+
+
+TRANSFORMS = {
+    'matrix': xform_matrix,
+    'scale': xform_scale,
+}
+
+
+def compile_polys(root, height):
+    """Compile the rock polygons.
+
+    Each outline is simplified twice, to separate tolerances for drawing
+    and for collision. The drawn outline is triangulated, and the
+    triangulation of the collision outline merged into convex pieces.
+
+    """
+    source_verts = 0
+    verts = []
+    tris = []
+    vert_counts = []
+    tri_counts = []
+    collision_verts = []
+    collision_vert_counts = []
+    collision_tri_counts = []
+    hulls = []
+    hull_counts = []
+    hull_vert_counts = []
+    draws = []
+    colors = []
+    frictions = []
+    for path in root.findall(f'.//{SVG_NS}path'):
+        draw, color = parse_fill(path.attrib.get('style', ''))
+        try:
+            friction = float(path.attrib['friction'])
+        except KeyError:
+            friction = math.nan
+
+        for loop in parse_path(path.attrib['d']):
+            loop[:, 1] = height - loop[:, 1]
+            source_verts += len(loop)
+
+            loop_verts = simplify_loop(
+                loop, DRAW_TOLERANCE, DRAW_MAX_VERTS
+            ).reshape(-1) * SVG_SCALE
+            indexes = earcut(loop_verts)
+
+            hull_verts = simplify_loop(
+                loop, COLLISION_TOLERANCE, COLLISION_MAX_VERTS
+            ).reshape(-1) * SVG_SCALE
+            hull_tris = earcut(hull_verts)
+            pieces = merge_convex(hull_verts, hull_tris)
+
+            verts.append(loop_verts)
+            tris.append(np.array(indexes, dtype=np.int32))
+            vert_counts.append(len(loop_verts) // 2)
+            tri_counts.append(len(indexes))
+            collision_verts.append(hull_verts)
+            collision_vert_counts.append(len(hull_verts) // 2)
+            collision_tri_counts.append(len(hull_tris) // 3)
+            hulls.extend(i for piece in pieces for i in piece)
+            hull_counts.append(len(pieces))
+            hull_vert_counts.extend(len(piece) for piece in pieces)
+            draws.append(draw)
+            colors.append(color)
+            frictions.append(friction)
+
+    return {
+        'poly_verts': np.concatenate(verts) if verts else np.zeros(0),
+        'poly_vert_counts': np.array(vert_counts, dtype=np.int32),
+        'poly_indexes': (
+            np.concatenate(tris) if tris else np.zeros(0, dtype=np.int32)
+        ),
+        'poly_index_counts': np.array(tri_counts, dtype=np.int32),
+        'source_vert_count': np.array(source_verts),
+        'collision_verts': (
+            np.concatenate(collision_verts) if collision_verts
+            else np.zeros(0)
+        ),
+        'collision_vert_counts': np.array(
+            collision_vert_counts, dtype=np.int32
+        ),
+        'collision_tri_counts': np.array(
+            collision_tri_counts, dtype=np.int32
+        ),
+        'poly_hull_counts': np.array(hull_counts, dtype=np.int32),
+        'hull_indexes': np.array(hulls, dtype=np.int32),
+        'hull_vert_counts': np.array(hull_vert_counts, dtype=np.int32),
+        'poly_draw': np.array(draws, dtype=bool),
+        'poly_color': np.array(colors, dtype=float).reshape(-1, 3),
+        'poly_friction': np.array(frictions, dtype=float),
+    }
+
+
+def compile_water(root, height):
+    """Compile the water rects as rows of (surf_y, x1, x2, bot_y)."""
+    rects = []
+    for r in root.findall(f'.//{SVG_NS}rect'):
+        x1 = float(r.attrib['x']) * SVG_SCALE
+        y = (height - float(r.attrib['y'])) * SVG_SCALE
+        x2 = x1 + float(r.attrib['width']) * SVG_SCALE
+        y_bot = y - float(r.attrib['height']) * SVG_SCALE
+        assert y > y_bot
+        rects.append((y, x1, x2, y_bot))
+    return {'water': np.array(rects, dtype=float).reshape(-1, 4)}
+
+
+def compile_entities(root, height):
+    """Compile the placements of images in the level.
+
+    Each entity is identified by the group and name of its image, and
+    placed by a row of (cx, cy, w, h, rot, scale, flip) in physics
+    coordinates.
+
+    """
+    groups = []
+    names = []
+    placements = []
+
+    for r in root.findall(f'.//{SVG_NS}image'):
+        href = r.attrib[XLINK_HREF]
+
+        mo = re.search(r'/([^/]+)/([^/]+)\.(png|jpg)$', href)
+        if not mo:
+            print(f"No match for {href}")
+            continue
+
+        group, name, ext = mo.groups()
+        if group == 'backgrounds':
+            continue
+
+        rot = 0
+        scale = 1
+        flip = False
+
+        cx = float(r.attrib['x']) + float(r.attrib['width']) * 0.5
+        cy = float(r.attrib['y']) + float(r.attrib['height']) * 0.5
+        try:
+            transform = r.attrib['transform']
+        except KeyError:
+            pass
+        else:
+            mat = eval(transform, TRANSFORMS)
+            a = mat @ np.array([
+                [cx, cy, 1],
+                [1, 0, 0],
+                [0, 1, 0],
+            ]).T
+            cx, cy = a[:2, 0]
+            flip = np.cross(a[..., 1], a[..., 2])[2] < 0
+            x1, x2, _ = a[..., 1]
+            rot = math.degrees(math.atan2(x2, x1))
+            scale = math.hypot(x1, x2)
+
+        w = float(r.attrib['width']) * SVG_SCALE
+        h = float(r.attrib['height']) * SVG_SCALE
+
+        # Convert to screen coords
+        cx = cx * SVG_SCALE
+        cy = (height - cy) * SVG_SCALE
+
+        groups.append(group)
+        names.append(f'{name}.{ext}')
+        placements.append((cx, cy, w, h, rot, scale, flip))
+
+    return {
+        'entity_group': np.array(groups, dtype=str),
+        'entity_name': np.array(names, dtype=str),
+        'entity_placement': np.array(placements, dtype=float).reshape(-1, 7),
+    }
+
+
+def source_hash(src):
+    """Return the key for the compiled level, given its SVG source."""
+    return hashlib.sha1(src).hexdigest()
+
+
+def compile_level(src):
+    """Compile the SVG source of a level into a dict of arrays."""
+    root = fromstring(src)
+    height = float(root.attrib['height'])
+    data = {
+        'version': np.array(FORMAT_VERSION),
+        'source_hash': np.array(source_hash(src)),
+    }
+    data.update(compile_polys(root, height))
+    data.update(compile_water(root, height))
+    data.update(compile_entities(root, height))
+    return data
+
+
+def cache_path(name):
+    """Return the path of the compiled level with the given name."""
+    return LEVEL_CACHE_PATH / f'{name}.npz'
+
+
+def read_compiled(name, src):
+    """Read the compiled level from the cache.
+
+    Return None if it is missing or was compiled from different source.
+
+    """
+    try:
+        with np.load(cache_path(name)) as npz:
+            data = dict(npz)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != FORMAT_VERSION or \
+            data.get('source_hash') != source_hash(src):
+        return None
+    return data
+
+
+def write_compiled(name, data):
+    """Write a compiled level to the cache, atomically."""
+    path = cache_path(name)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp, 'wb') as f:
+        np.savez(f, **data)
+    os.replace(tmp, path)
+
+
+def load_compiled(name, src):
+    """Get the compiled form of the level, compiling it if necessary."""
+    data = read_compiled(name, src)
+    if data is None:
+        data = compile_level(src)
+        try:
+            write_compiled(name, data)
+        except OSError:
+            # The cache is only an optimisation
+            pass
+    return data
@@ -1,167 +1,163 @@
-import numpy as np
 import math
-import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pyglet.resource
-from xml.etree.ElementTree import parse
-from pymunk import Vec2d
 
-from .sprites import load_centered
+from .sprites import (
+    Sprite, load_centered, find_image, preload_image, discard_preloaded
+)
 from .water import Water
-from .geom import SPACE_SCALE, phys_to_screen
+from .geom import phys_to_screen
 from .poly import RockPoly
 from .actors import Butterfly, Fly, Frog, Fish, Goldfish
 from .scenery import Platform, Lilypad
-
-
-COMMA_WSP = re.compile(r'(?:\s+,?\s*|,\s*)')
-
-
-def path_toks(path):
-    """Iterate over components of path as tokens."""
-    toks = COMMA_WSP.split(path)
-    for tok in toks:
-        if not tok:
-            continue
-        elif tok.isalpha():
-            yield tok
-        else:
-            try:
-                v = float(tok)
-            except ValueError:
-                raise ValueError(
-                    f"Couldn't parse {tok!r} from {path!r}"
-                )
-            yield v
-
-
-def parse_path(path_str):
-    verts = []
-    path = []
-    pos = Vec2d(0, 0)
-
-    toks = path_toks(path_str)
-
-    next = toks.__next__
-
-    def line():
-        path.append(tuple(pos))
-
-    op = 'l'
-    for tok in toks:
-        if isinstance(tok, str):
-            if tok in ('m', 'M'):
-                if path:
-                    verts.append(path)
-                    path = []
-                v = Vec2d(next(), next())
-                if tok == 'M':
-                    pos = v
-                    op = 'L'
-                else:
-                    pos += v
-                    op = 'l'
-                line()
-            elif op in ('z', 'Z'):
-                pos = path[0]
-                line()
-                verts.append(path)
-                path = []
-            else:
-                op = tok
-                continue
-        else:
-            if op == 'l':
-                pos += Vec2d(tok, next())
-                line()
-            elif op == 'L':
-                pos = Vec2d(tok, next())
-                line()
-            elif op == 'H':
-                pos.x = tok
-                line()
-            elif op == 'h':
-                pos.x += tok
-                line()
-            elif op == 'V':
-                pos.y = tok
-                line()
-            elif op == 'v':
-                pos.y += tok
-                line()
-            elif op == 'c':
-                for _ in range(3):
-                    next()
-                pos += Vec2d(next(), next())
-                line()
-            elif op == 'C':
-                for _ in range(3):
-                    next()
-                pos = Vec2d(next(), next())
-                line()
-            else:
-                raise ValueError(f"Unknown path op {op}")
-    if path:
-        verts.append(path)
-    return verts
+from .level_compiler import load_compiled, source_hash, SVG_SCALE
 
 
 class NoSuchLevel(Exception):
     """Raised when the level name does not exist."""
 
 
-SVG_SCALE = 2 * SPACE_SCALE
+# Compiled levels that have been loaded this session, by level name
+compiled_levels = {}
 
+# Levels being prepared in the background, by level name
+preloads = {}
+preloader = ThreadPoolExecutor(max_workers=1)
 
-def load_level(level):
+
+def read_level(name):
+    """Read the SVG source of the level with the given name."""
     try:
-        f = pyglet.resource.file(f'levels/{level.name}.svg')
+        f = pyglet.resource.file(f'levels/{name}.svg', 'rb')
     except pyglet.resource.ResourceNotFoundException:
-        raise NoSuchLevel(f"Level {level.name} does not exist")
-    doc = parse(f)
-    height = float(doc.getroot().attrib['height'])
-    for path in doc.findall('.//{http://www.w3.org/2000/svg}path'):
-        for loop in parse_path(path.attrib['d']):
-            verts = np.array(
-                [(x, (height - y)) for x, y in loop],
-            )
-            style = path.attrib.get('style', '')
-            mo = re.search(r'(?:[; ]|^)fill *: *([^;]+)(?:;|$)', style)
-            if mo:
-                fill = mo.group(1)
-            else:
-                fill = 'none'
-            draw = fill and fill != 'none'
-            if fill.startswith('#'):
-                color = int(fill[1:7], 16)
-                color, b = divmod(color, 256)
-                r, g = divmod(color, 256)
-                color = np.array([r, g, b]) / 255
-            else:
-                color = (0.5, 0.4, 0.3)
+        raise NoSuchLevel(f"Level {name} does not exist")
+    with f:
+        return f.read()
+
 
+def get_compiled(name):
+    """Get the compiled data for the level with the given name.
+
+    The SVG is always read, so that edits to levels are picked up, but it is
+    only parsed if it has changed since it was last compiled.
+
+    """
+    src = read_level(name)
+    data = compiled_levels.get(name)
+    if data is None or data['source_hash'] != source_hash(src):
+        data = compiled_levels[name] = load_compiled(name, src)
+    return data
+
+
+def preload_level(name, images=()):
+    """Start preparing the level with the given name on a worker thread.
+
+    The level is compiled, and its scenery and the given extra image
+    resources are decoded, so that loading it later only has to upload
+    textures and create physics objects.
+
+    Only one level is kept preloaded: a level preloaded earlier that hasn't
+    been loaded since is discarded, along with its decoded images.
+
+    """
+    for other in [n for n in preloads if n != name]:
+        preloads.pop(other).add_done_callback(discard_preload)
+    if name not in preloads:
+        preloads[name] = preloader.submit(prepare_level, name, images)
+
+
+def discard_preload(future):
+    """Drop the images decoded for a preload that will never be loaded."""
+    if not future.cancelled() and not future.exception():
+        _, paths = future.result()
+        discard_preloaded(paths)
+
+
+def prepare_level(name, images=()):
+    """Compile a level and decode its images.
+
+    Return the compiled data, and the paths of the images that were found.
+    Image resources that don't exist are skipped.
+
+    """
+    data = get_compiled(name)
+    found = []
+    for path in images:
+        try:
+            preload_image(path)
+        except pyglet.resource.ResourceNotFoundException:
+            continue
+        found.append(path)
+    for group, filename in zip(data['entity_group'], data['entity_name']):
+        if group == 'scenery':
+            stem = str(filename).rsplit('.', 1)[0]
             try:
-                friction = float(path.attrib['friction'])
-            except KeyError:
-                friction = None
-
-            level.objs.append(
-                RockPoly(
-                    verts.reshape(-1) * SVG_SCALE,
-                    draw=draw,
-                    color=color,
-                    friction=friction,
-                )
+                path, _ = find_image(f'{group}/{stem}', preload_image)
+            except pyglet.resource.ResourceNotFoundException:
+                continue
+            found.append(path)
+    return data, found
+
+
+def load_level(level):
+    future = preloads.pop(level.name, None)
+    if future:
+        data, _ = future.result()
+    else:
+        data = get_compiled(level.name)
+    level.compiled = data
+    load_polys(data, level)
+    load_water(data)
+    # All the static objects are added to the space before any actors, as
+    # when the level is reloaded
+    load_entities(data, level, actors=False)
+    load_entities(data, level, scenery=False)
+
+
+def reload_actors(level):
+    """Recreate the actors of the loaded level, keeping its static objects."""
+    load_entities(level.compiled, level, scenery=False)
+
+
+def split(arr, counts):
+    """Split arr into consecutive pieces of the given lengths."""
+    return np.split(arr, np.cumsum(counts)[:-1]) if len(counts) else []
+
+
+def load_polys(data, level):
+    verts = split(data['poly_verts'], data['poly_vert_counts'] * 2)
+    indexes = split(data['poly_indexes'], data['poly_index_counts'])
+    collision_verts = split(
+        data['collision_verts'], data['collision_vert_counts'] * 2
+    )
+    hulls = iter(split(data['hull_indexes'], data['hull_vert_counts']))
+    for v, idx, cv, hull_count, draw, color, friction in zip(
+            verts,
+            indexes,
+            collision_verts,
+            data['poly_hull_counts'],
+            data['poly_draw'],
+            data['poly_color'],
+            data['poly_friction']):
+        poly_hulls = [next(hulls) for _ in range(hull_count)]
+        level.objs.append(
+            RockPoly(
+                v,
+                draw=draw,
+                color=color,
+                friction=None if math.isnan(friction) else friction,
+                indexes=idx,
+                collision_verts=cv,
+                hulls=poly_hulls,
             )
+        )
 
-    for r in doc.findall('.//{http://www.w3.org/2000/svg}rect'):
-        x1 = float(r.attrib['x']) * SVG_SCALE
-        y = (height - float(r.attrib['y'])) * SVG_SCALE
-        x2 = x1 + float(r.attrib['width']) * SVG_SCALE
-        y_bot = y - float(r.attrib['height']) * SVG_SCALE
-        assert y > y_bot
-        Water(y, x1, x2, y_bot)
 
-    load_entities(doc, level)
+def load_water(data):
+    for y, x1, x2, y_bot in data['water']:
+        Water(y, x1, x2, y_bot)
 
 
 ACTOR_TYPES = {
@@ -173,102 +169,54 @@ ACTOR_TYPES = {
 }
 
 
-def xform_matrix(a, b, c, d, e, f):
-    return np.array([
-        [a, c, e],
-        [b, d, f],
-        [0, 0, 1],
-    ])
-
-
-def xform_scale(x, y=None):
-    if y is None:
-        y = x
-    return np.array([
-        [x, 0, 0],
-        [0, y, 0],
-        [0, 0, 1],
-    ])
-
-
-TRANSFORMS = {
-    'matrix': xform_matrix,
-    'scale': xform_scale,
-}
+def load_entities(data, level, scenery=True, actors=True):
+    """Create the entities of a level.
 
+    If scenery is False, only actors are created; if actors is False, only
+    scenery and platforms are.
 
-def load_entities(doc, level):
-    height = float(doc.getroot().attrib['height'])
-
+    """
     imgs = {}
 
-    for r in doc.findall('.//{http://www.w3.org/2000/svg}image'):
-        href = r.attrib['{http://www.w3.org/1999/xlink}href']
-
-        mo = re.search(r'/([^/]+)/([^/]+)\.(png|jpg)$', href)
-        if not mo:
-            print(f"No match for {href}")
-            continue
-
-        group, name, ext = mo.groups()
-        if group == 'backgrounds':
-            continue
-
-        rot = 0
-        scale = 1
-        flip = False
-
-        cx = float(r.attrib['x']) + float(r.attrib['width']) * 0.5
-        cy = float(r.attrib['y']) + float(r.attrib['height']) * 0.5
-        try:
-            transform = r.attrib['transform']
-        except KeyError:
-            pass
-        else:
-            mat = eval(transform, TRANSFORMS)
-            a = mat @ np.array([
-                [cx, cy, 1],
-                [1, 0, 0],
-                [0, 1, 0],
-            ]).T
-            cx, cy = a[:2, 0]
-            flip = np.cross(a[..., 1], a[..., 2])[2] < 0
-            x1, x2, _ = a[..., 1]
-            rot = math.degrees(math.atan2(x2, x1))
-            scale = math.hypot(x1, x2)
-
-        w = float(r.attrib['width']) * SVG_SCALE
-        h = float(r.attrib['height']) * SVG_SCALE
-
-        # Convert to screen coords
-        cx = cx * SVG_SCALE
-        cy = (height - cy) * SVG_SCALE
+    for group, filename, placement in zip(
+            data['entity_group'],
+            data['entity_name'],
+            data['entity_placement']):
+        name, ext = str(filename).rsplit('.', 1)
+        cx, cy, w, h, rot, scale, flip = placement
 
         if group == 'scenery':
-            k = f'scenery/{name}.{ext}'
+            if not scenery:
+                continue
+            k = f'scenery/{filename}'
             try:
                 img = imgs[k]
             except KeyError:
                 img = imgs[k] = load_centered(name, group)
 
-            s = pyglet.sprite.Sprite(img, batch=level.fg_batch)
+            s = Sprite(img, batch=level.fg_batch)
             s.position = phys_to_screen(cx, cy)
             s.rotation = rot
-            scale = float(r.attrib['width']) * scale / img.width * 2
+            scale = w / SVG_SCALE * scale / img.width * 2
             s.scale = scale
             if flip:
                 s.scale_y = -1
             level.objs.append(s)
             continue
 
+        if filename == 'platform.png':
+            if scenery:
+                level.objs.append(
+                    Platform(cx - w // 2, cy - h // 2)
+                )
+            continue
+        if not actors:
+            continue
+
         cls = ACTOR_TYPES.get(name)
         if cls:
             level.actors.append(cls(cx, cy))
             continue
-        elif 'jumper.png' in href:
+        elif filename == 'jumper.png':
             frog = level.pc = Frog(cx, cy)
             level.actors.append(frog)
-        elif 'platform.png' in href:
-            level.objs.append(
-                Platform(cx - w // 2, cy - h // 2)
-            )
@@ -1,17 +1,25 @@
 import json
+import math
 
 from pymunk import Vec2d
+from pyglet import gl
 import pyglet.graphics
+import pyglet.image
+import pyglet.resource
 import pyglet.sprite
 import pyglet.clock
 from pyglet.event import EVENT_HANDLED
+from pyglet.image.codecs import ImageDecodeException
 
 from .directions import Direction
 from . import ASSETS_PATH, SAVE_PATH
-from .sprites import load_centered
+from .sprites import (
+    load_centered, load_image, find_image, preload_image, center, textures
+)
 from .actors import actor_sprites
-from .level_loader import NoSuchLevel
+from .level_loader import NoSuchLevel, preloader
 from .keys import KeyInputHandler
+from .scheduler import defer
 from . import sounds
 from . import PIXEL_SCALE
 
@@ -54,6 +62,7 @@ class LevelList:
 
 class LevelProgress:
     def __init__(self):
+        self.save_pending = False
         if SAVE_PATH.exists():
             self.progress = json.loads(SAVE_PATH.read_text())
         else:
@@ -75,6 +84,12 @@ class LevelProgress:
         if d.get(level, 0) >= value:
             return
         d[level] = value
+        if not self.save_pending:
+            self.save_pending = True
+            defer(self.save)
+
+    def save(self):
+        self.save_pending = False
         SAVE_PATH.write_text(json.dumps(self.progress))
 
 
@@ -83,15 +98,12 @@ progress = LevelProgress()
 
 
 class HopTween:
-    def __init__(self, screen, sprite, duration=0.2):
-        self.screen = screen
+    def __init__(self, sprite, duration=0.2):
         self.sprite = sprite
         self.duration = duration
 
     def go(self, target_pos):
-        start_y = self.sprite.y
-        start_x = self.sprite.real_x
-        self.start_pos = Vec2d(start_x, start_y)
+        self.start_pos = Vec2d(*self.sprite.position)
         self.target_pos = Vec2d(*target_pos)
 
         self.t = 0
@@ -102,9 +114,7 @@ class HopTween:
             return
         self.t += dt
         if self.t > self.duration:
-            x, y = self.target_pos
-            self.sprite.position = (x - self.screen.offset, y)
-            self.sprite.real_x = x
+            self.sprite.position = tuple(self.target_pos)
             self.sprite.scale = 1
             pyglet.clock.unschedule(self.update)
             return
@@ -113,21 +123,67 @@ class HopTween:
 
         x, y = self.start_pos + frac * (self.target_pos - self.start_pos)
         scale = 1.0 + frac * (1.0 - frac) * 4
-        self.sprite.update(
-            x - self.screen.offset, y,
-            scale=scale
-        )
-        self.sprite.real_x = x
+        self.sprite.update(x, y, scale=scale)
 
     def stop(self):
         self.sprite = None
         pyglet.clock.unschedule(self.update)
 
 
+class ScrollGroup(pyglet.graphics.Group):
+    """A group that scrolls everything drawn in it to the left by offset.
+
+    Scrolling the view this way means that sprites never need to be moved.
+
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.offset = 0
+
+    def set_state(self):
+        gl.glPushMatrix()
+        gl.glTranslatef(-self.offset, 0, 0)
+
+    def unset_state(self):
+        gl.glPopMatrix()
+
+
+# Resource paths of level thumbnails that have been found, by level name
+thumbnail_paths = {}
+
+
+def preload_thumbnail(level):
+    """Decode the thumbnail of a level, returning its resource path.
+
+    This doesn't touch GL, so it runs on the preloader thread. Return None
+    if the level has no thumbnail.
+
+    """
+    try:
+        path, _ = find_image(f'levelthumbs/{level}', preload_image)
+    except pyglet.resource.ResourceNotFoundException:
+        return None
+    thumbnail_paths[level] = path
+    return path
+
+
 class LevelSelectScreen:
-    basegroup = pyglet.graphics.OrderedGroup(0)
-    stargroup = pyglet.graphics.OrderedGroup(1)
-    cursorgroup = pyglet.graphics.OrderedGroup(2)
+    """The map of levels, and the frog that hops between them.
+
+    Sprites are only created for the levels near the viewport, and are
+    created and deleted as the map scrolls. Level thumbnails are decoded in
+    the background, and shown as a placeholder until they are ready.
+
+    """
+    LEFT = 200
+    YSPACING = 350
+    XSPACING = YSPACING * 3 ** 0.5 / 2
+
+    # Levels are given sprites within this distance of the viewport
+    MARGIN = XSPACING
+
+    THUMBNAIL_SIZE = 120, 90
+    PLACEHOLDER_COLOR = (40, 60, 40, 255)
 
     def __init__(self, window, slowmo=False):
         self.slowmo = slowmo
@@ -136,6 +192,13 @@ class LevelSelectScreen:
         self.offset = 0
         self.target_offset = 0
 
+        self.scroll = ScrollGroup()
+        self.basegroup = pyglet.graphics.OrderedGroup(0, parent=self.scroll)
+        self.stargroup = pyglet.graphics.OrderedGroup(1, parent=self.scroll)
+        self.cursorgroup = pyglet.graphics.OrderedGroup(
+            2, parent=self.scroll
+        )
+
         self.sprites = [
             pyglet.sprite.Sprite(
                 load_centered('level-select', 'ui'),
@@ -158,56 +221,42 @@ class LevelSelectScreen:
             group=self.cursorgroup,
         )
         self.sprites.append(self.frog)
-        for s in self.sprites:
-            s.real_x = s.x
-        self.tween = HopTween(self, self.frog)
+        self.tween = HopTween(self.frog)
 
-        star_imgs = [
+        self.star_imgs = [
             load_centered('locked', 'ui'),
             load_centered('1star', 'ui'),
             load_centered('2stars', 'ui'),
             load_centered('3stars', 'ui'),
         ]
-        stars = 1
-        locked = False
-
-        self.unlocked = {0}
+        self.placeholder = center(
+            pyglet.image.SolidColorImagePattern(
+                self.PLACEHOLDER_COLOR
+            ).create_image(*self.THUMBNAIL_SIZE).get_texture()
+        )
 
+        # Stars of the unlocked levels, by index; the level after the first
+        # without stars is the last one unlocked
+        self.stars = {}
+        stars = 1
         for i, level in enumerate(LEVELS, start=1):
-            x, y = self.screen_pos(i)
             if not stars:
-                locked = True
-            else:
-                stars = progress.get_stars(level, self.slowmo)
-                self.unlocked.add(i)
+                break
+            stars = progress.get_stars(level, self.slowmo)
+            self.stars[i] = stars
+        self.unlocked = {0, *self.stars}
 
-            if locked:
-                img = star_imgs[0]
-            else:
-                img = load_centered(level, 'levelthumbs')
+        # Sprites of the levels near the viewport, by index
+        self.level_sprites = {}
+        self.visible = range(0)
 
-            levsprite = pyglet.sprite.Sprite(
-                img,
-                x, y,
-                batch=actor_sprites,
-                group=self.basegroup,
-            )
-            levsprite.real_x = x
-            levsprite.scale = 2
-            self.sprites.append(levsprite)
-
-            if stars:
-                starsprite = pyglet.sprite.Sprite(
-                    star_imgs[stars],
-                    x, y,
-                    batch=actor_sprites,
-                    group=self.stargroup,
-                )
-                starsprite.real_x = x
-                self.sprites.append(starsprite)
+        # Thumbnails being decoded, by level index
+        self.thumbnails = {}
 
+        x, _ = self.screen_pos(len(LEVELS))
         self.max_offset = x - window.width + 400
         self.cursor = 0
+        self.update_visible()
 
     def jump(self, direction):
         newcursor = self.cursor
@@ -262,23 +311,99 @@ class LevelSelectScreen:
     def screen_pos(self, i):
         """Screen pos for the level at index i."""
         top = self.window.height / PIXEL_SCALE - 320
-        left = 200
-        yspacing = 350
-        xspacing = yspacing * 3 ** 0.5 / 2
 
         group, i = divmod(i, 5)
         col, row = divmod(i, 3)
         if col == 1:
             row += 1
-        x = left + xspacing * (col + 2 * group)
-        y = top - yspacing * (row - 0.5 * (col % 2))
+        x = self.LEFT + self.XSPACING * (col + 2 * group)
+        y = top - self.YSPACING * (row - 0.5 * (col % 2))
         return x, y
 
+    def visible_range(self):
+        """Return the range of level indexes near the viewport."""
+        left = self.offset - self.MARGIN
+        right = self.offset + self.window.width / PIXEL_SCALE + self.MARGIN
+
+        # Each group of 5 levels spans two columns
+        first = math.floor((left - self.LEFT) / self.XSPACING / 2)
+        last = math.floor((right - self.LEFT) / self.XSPACING / 2)
+        return range(max(1, first * 5), min(len(LEVELS), last * 5 + 4) + 1)
+
+    def update_visible(self):
+        """Create and delete level sprites as they scroll in or out of view."""
+        visible = self.visible_range()
+        if visible == self.visible:
+            return
+        self.visible = visible
+        for i in set(self.level_sprites).difference(visible):
+            self.delete_level_sprites(i)
+        for i in visible:
+            if i not in self.level_sprites:
+                self.create_level_sprites(i)
+
+    def create_level_sprites(self, i):
+        x, y = self.screen_pos(i)
+        level = LEVELS[i - 1]
+        stars = self.stars.get(i)
+        if stars is None:
+            img = self.star_imgs[0]
+        else:
+            path = thumbnail_paths.get(level)
+            if path in textures:
+                img = textures[path]
+            else:
+                img = self.placeholder
+                self.thumbnails[i] = preloader.submit(
+                    preload_thumbnail, level
+                )
+
+        levsprite = pyglet.sprite.Sprite(
+            img,
+            x, y,
+            batch=actor_sprites,
+            group=self.basegroup,
+        )
+        levsprite.scale = 2
+        sprites = [levsprite]
+
+        if stars:
+            sprites.append(pyglet.sprite.Sprite(
+                self.star_imgs[stars],
+                x, y,
+                batch=actor_sprites,
+                group=self.stargroup,
+            ))
+        self.level_sprites[i] = sprites
+
+    def delete_level_sprites(self, i):
+        for s in self.level_sprites.pop(i):
+            s.delete()
+        future = self.thumbnails.pop(i, None)
+        if future:
+            future.cancel()
+
+    def update_thumbnails(self):
+        """Replace placeholders with the thumbnails that have been decoded."""
+        for i, future in list(self.thumbnails.items()):
+            if not future.done():
+                continue
+            del self.thumbnails[i]
+            try:
+                path = future.result()
+            except (OSError, ImageDecodeException) as e:
+                # Leave the placeholder in place of a thumbnail that's bad
+                print(f"Couldn't load the thumbnail of {LEVELS[i - 1]}: {e}")
+                continue
+            if path:
+                self.level_sprites[i][0].image = center(load_image(path))
+
     def update(self, dt):
         frac = 0.1 ** dt
         self.offset = frac * self.offset + (1.0 - frac) * self.target_offset
-        for s in self.sprites:
-            s.x = s.real_x - self.offset
+        self.scroll.offset = self.offset
+        self.update_visible()
+        self.update_thumbnails()
 
     def start(self):
         from .main import hud, clear_handlers
@@ -302,6 +427,8 @@ class LevelSelectScreen:
     def delete(self):
         for s in self.sprites:
             s.delete()
+        for i in list(self.level_sprites):
+            self.delete_level_sprites(i)
         self.window.pop_handlers()
         self.window.pop_handlers()
         self.tween.stop()
@@ -1,8 +1,10 @@
+import time
+from pathlib import Path
+
 import pyglet
 from pyglet import gl
 import pyglet.sprite
 import pyglet.resource
-from pymunk.vec2d import Vec2d
 import moderngl
 from pyrr import Matrix44
 import pymunk.pyglet_util
@@ -10,33 +12,50 @@ from pyglet.event import EVENT_HANDLED
 
 from . import PIXEL_SCALE
 import wtf.keys
-from .directions import Direction
+from . import physics
 from .physics import (
-    space, COLLISION_TYPE_FROG, COLLISION_TYPE_COLLECTIBLE, create_walls
+    space, save_states, collision_handlers, COLLISION_TYPE_FROG
 )
-from .state import LevelState, UnderwaterState
+from .state import LevelState
 from .water import Water, WaterBatch
-from .geom import SPACE_SCALE
-from .actors import actor_sprites, Frog, Fly
+from .geom import SPACE_SCALE, WIDTH, HEIGHT
+from .actors import actor_sprites
 from .hud import HUD
-from .offscreen import OffscreenBuffer
+from .offscreen import OffscreenBuffer, StaticLayer, DynamicResolution
 from .poly import RockPoly
-from .level_loader import load_level, NoSuchLevel
-from .screenshot import take_screenshot
+from .level import Level as BaseLevel
+from .simulation import STEP, FRAME_STEPS
+from .level_loader import NoSuchLevel, preload_level
+from .screenshot import ScreenshotCapture
+from .video import VideoCapture, VideoWriter
+from .sprites import load_image
+from .replay import Recording
+from .timings import FrameTimer, TimingOverlay
+from .scheduler import scheduler
 from . import sounds
 from .level_select import LevelSelectScreen, LEVELS, progress
 
 
-SCREENSHOTS = False
-
+# Directory to save recordings of each attempt at a level into, if any
+RECORD_DIR = None
 
-WIDTH = 1600   # Width in hidpi pixels
-HEIGHT = 1200  # Height in hidpi pixels
+# Captures every frame drawn to the window as video, if recording
+video = None
 
 
 easy_mode = False
 slowmo = False
 
+# Physics runs at a fixed STEP, with the water updated every FRAME_STEPS
+# steps, exactly as in wtf.simulation. Each frame takes as many steps as
+# have come due, but no more than MAX_STEPS: past that the game slows down
+# rather than falling ever further behind.
+MAX_STEPS = 18
+
+# Game time not yet simulated, and steps taken in this attempt at the level
+physics_time = 0.0
+physics_steps = 0
+
 window = pyglet.window.Window(
     width=round(WIDTH * PIXEL_SCALE),
     height=round(HEIGHT * PIXEL_SCALE)
@@ -44,31 +63,7 @@ window = pyglet.window.Window(
 
 
 mgl = moderngl.create_context()
-
-
-def water(y, x1=0, x2=WIDTH * SPACE_SCALE, bot_y=0):
-    return Water(y, x1, x2, bot_y)
-
-
-def on_collect(arbiter, space, data):
-    """Called when a collectible is hit"""
-    fly, frog = arbiter.shapes
-    frog.obj.lick(fly.obj.sprite.position)
-    fly.obj.collect(frog, controls)
-    space.remove(fly)
-    level.actors.remove(fly.obj)
-    if not Fly.insts:
-        pyglet.clock.schedule_once(level.win, 0.8)
-
-    sounds.play('lick')
-    return False
-
-
-handler = space.add_collision_handler(
-    COLLISION_TYPE_COLLECTIBLE,
-    COLLISION_TYPE_FROG
-)
-handler.begin = on_collect
+screenshots = ScreenshotCapture(window, mgl)
 
 
 def on_hit(arbiter, space, data):
@@ -85,39 +80,33 @@ def on_hit(arbiter, space, data):
     return True
 
 
-handler = space.add_collision_handler(
-    COLLISION_TYPE_FROG, 0
-)
-handler.begin = on_hit
+@collision_handlers
+def add_hit_handler():
+    handler = space.add_collision_handler(COLLISION_TYPE_FROG, 0)
+    handler.begin = on_hit
 
 
-class Level:
-    def __init__(self, name=None):
-        self.state = LevelState.PLAYING
-        self.pc = None
-        self.objs = []
-        self.actors = []
-        self.static_shapes = []
+class Level(BaseLevel):
+    """A level as presented in the game window."""
 
+    def __init__(self, name=None, hud=None):
         self.background = pyglet.sprite.Sprite(
             pyglet.resource.image('backgrounds/default.jpg')
         )
-        self.fg_batch = pyglet.graphics.Batch()
-        if name:
-            self.load(name)
+        super().__init__(name, hud=hud)
 
     def load(self, level_name):
         """Load the given level name."""
-        self.name = level_name
-        self.reload()
-        if SCREENSHOTS:
-            pyglet.clock.schedule_once(
-                lambda dt: take_screenshot(
-                    window,
-                    f'assets/levelpics/{level_name}.png'
-                ),
-                0.3
-            )
+        super().load(level_name)
+        self.preload_next()
+
+    def preload_next(self):
+        """Prepare the next level in the background while this is played."""
+        try:
+            name = LEVELS.next(self.name)
+        except (NoSuchLevel, ValueError):
+            return
+        preload_level(name, images=[f'backgrounds/{name}.jpg'])
 
     def next_level(self):
         """Progress to the next level."""
@@ -128,17 +117,11 @@ class Level:
             hud.show_card('end')
             self.state = LevelState.END
 
-    @property
-    def won(self):
-        if self.state == LevelState.PLAYING:
-            return None
-
-        return self.state.value > 2
-
     def win(self, *_):
         if self.state is not LevelState.PLAYING:
             return
-        self.state = LevelState.PERFECT
+        super().win()
+        self.save_recording()
         sounds.play('orchhit3')
         hud.show_card('3star')
         progress.set_stars(self.name, easy_mode, 3)
@@ -147,78 +130,85 @@ class Level:
         if self.state is not LevelState.PLAYING:
             return
 
-        flies_remaining = len(Fly.insts)
-        if flies_remaining == 1:
-            hud.show_card('2star')
-            sounds.play('orchhit2')
-            progress.set_stars(self.name, easy_mode, 2)
-            self.state = LevelState.WON
-        elif flies_remaining == 2:
-            hud.show_card('1star')
-            sounds.play('orchhit1')
-            progress.set_stars(self.name, easy_mode, 1)
-            self.state = LevelState.WON
+        super().fail()
+        self.save_recording()
+        if self.state is LevelState.WON:
+            stars = self.stars
+            hud.show_card(f'{stars}star')
+            sounds.play(f'orchhit{stars}')
+            progress.set_stars(self.name, easy_mode, stars)
         else:
-            self.state = LevelState.FAILED
             sounds.play('fail')
             hud.show_card('fail')
 
     def create(self):
-        global slowmo
-        self.state = LevelState.PLAYING
-        self.pc = None
-        self.objs = []
-        self.actors = []
-        self.static_shapes = create_walls(space, WIDTH, HEIGHT)
+        super().create()
+        # After the level is loaded, so that a preloaded background is ready
         self.set_background(self.name)
-        load_level(self)
-        if self.pc is None:
-            self.pc = Frog(6, 7)
-        controls.reset()
-        controls.pc = self.pc
-        sounds.play('ribbit')
+        static_layer.invalidate()
+
+    def delete(self):
+        super().delete()
+        static_layer.invalidate()
+
+    def start(self):
+        global slowmo, physics_steps
+        # Winning and failing are scheduled on a clock that runs on the
+        # physics steps of this attempt, as in wtf.simulation, so that they
+        # happen at the same step when the attempt is replayed
+        physics_steps = 0
+        self.clock = pyglet.clock.Clock(time_function=step_time)
+        super().start()
         slowmo = False
+        if RECORD_DIR:
+            self.controls.recording = Recording(self.name, easy=easy_mode)
+
+    def save_recording(self):
+        """Save the recording of the attempt that has just finished."""
+        rec = self.controls.recording
+        if not rec:
+            return
+        self.controls.recording = None
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = Path(RECORD_DIR) / f'{self.name}-{stamp}.replay'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rec.save(path)
 
     def set_background(self, name):
         try:
-            img = pyglet.resource.image(f'backgrounds/{name}.jpg')
+            img = load_image(f'backgrounds/{name}.jpg')
         except pyglet.resource.ResourceNotFoundException:
-            img = pyglet.resource.image('backgrounds/default.jpg')
+            img = load_image('backgrounds/default.jpg')
         self.background.image = img
+        static_layer.invalidate()
 
-    def reload(self):
-        self.delete()
-        self.create()
-
-    def delete(self):
-        for o in self.objs:
-            try:
-                o.delete()
-            except KeyError:
-                raise KeyError(f"Couldn't delete {o}")
-        for a in self.actors:
-            a.delete()
-        for w in Water.insts[:]:
-            w.delete()
-        self.pc = None
-        space.remove(*self.static_shapes)
-        self.static_shapes = []
-        self.actors = []
-        self.objs = []
-        self.fg_batch = pyglet.graphics.Batch()
-        assert not space.bodies, f"Space contains bodies: {space.bodies}"
-        assert not space.shapes, f"Space contains shapes: {space.shapes}"
 
+timer = FrameTimer([
+    'actors',
+    'water',
+    'scene',
+    'composite',
+    'water render',
+    'hud',
+    'physics',
+])
+timing_overlay = TimingOverlay(timer)
 
-fps_display = pyglet.clock.ClockDisplay()
 
+# The scene is drawn at the size of the window, or smaller if dynamic
+# resolution is enabled and the GPU can't keep up
+offscreen = OffscreenBuffer(window.width, window.height, mgl)
+resolution = DynamicResolution(offscreen, mgl, enabled=False)
 
-offscreen = OffscreenBuffer(WIDTH, HEIGHT, mgl)
+# The background and rocks, which are drawn once per level
+static_layer = StaticLayer(window.width, window.height, mgl)
 
 
 water_batch = WaterBatch(mgl)
 
-level = Level()
+hud = HUD(WIDTH, HEIGHT)
+level = Level(hud=hud)
+controls = level.controls
 
 pymunk_drawoptions = pymunk.pyglet_util.DrawOptions()
 
@@ -228,27 +218,58 @@ def on_draw(dt):
         dt *= 1 / 3
 
     # Update graphical things
-    for a in level.actors:
-        a.update(dt)
+    with timer.phase('actors'):
+        for a in level.actors:
+            a.update(dt)
 
-    for w in Water.insts:
-        w.update(dt)
-
-    hud.update(dt)
+    with timer.phase('hud'):
+        hud.update(dt)
+    timing_overlay.update(dt)
 
     window.clear()
 
-    with offscreen.bind_buffer() as fbuf:
-        fbuf.clear(0.13, 0.1, 0.1)
-        gl.glLoadIdentity()
-        gl.glScalef(PIXEL_SCALE, PIXEL_SCALE, 1)
-        level.background.draw()
-        RockPoly.batch.draw()
-        actor_sprites.draw()
-        level.fg_batch.draw()
-
-    mgl.screen.clear()
-    offscreen.draw()
+    with resolution.measure():
+        draw_scene(dt)
+
+    with timer.phase('hud'):
+        hud.draw()
+    timing_overlay.draw()
+    screenshots.end_frame()
+    if video:
+        video.end_frame()
+    timer.end_frame()
+
+
+def draw_static():
+    """Draw the parts of the scene that stay still throughout a level."""
+    static_layer.fbuf.clear(0.13, 0.1, 0.1)
+    gl.glLoadIdentity()
+    gl.glScalef(PIXEL_SCALE, PIXEL_SCALE, 1)
+    level.background.draw()
+    RockPoly.batch.draw()
+
+
+def draw_scene(dt):
+    """Draw the scene offscreen, then to the window with the water."""
+    with timer.phase('scene'):
+        static_layer.resize(*offscreen.size)
+        static_layer.render(draw_static)
+
+        with offscreen.bind_buffer():
+            static_layer.draw()
+            gl.glUseProgram(0)
+            gl.glBindVertexArray(0)
+
+            gl.glLoadIdentity()
+            gl.glScalef(PIXEL_SCALE, PIXEL_SCALE, 1)
+            actor_sprites.draw()
+            # Scenery is in front of the actors, so it can't be cached in
+            # the opaque static layer
+            level.fg_batch.draw()
+
+    with timer.phase('composite'):
+        mgl.screen.clear()
+        offscreen.draw()
 
     mvp = Matrix44.orthogonal_projection(
         0, WIDTH * SPACE_SCALE,
@@ -257,81 +278,16 @@ def on_draw(dt):
         dtype='f4'
     )
 
-    with offscreen.bind_texture(location=0):
+    with timer.phase('water render'), offscreen.bind_texture(location=0):
         water_batch.tex_uniform.value = 0
         water_batch.render(dt, mvp)
     gl.glUseProgram(0)
     gl.glBindVertexArray(0)
 
-    hud.draw()
-
 #    gl.glLoadIdentity()
 #    gl.glScalef(PIXEL_SCALE / SPACE_SCALE, PIXEL_SCALE / SPACE_SCALE, 1)
 #    space.debug_draw(pymunk_drawoptions)
 
-#    fps_display.draw()
-
-
-class JumpController:
-    """Control the frog's jumps.
-
-    We track which jumps the frog has available.
-
-    """
-    IMPULSE_SCALE = 26
-    JUMP_IMPULSES = {
-        Direction.UL: Vec2d.unit().rotated_degrees(30) * IMPULSE_SCALE,
-        Direction.U: Vec2d.unit() * IMPULSE_SCALE,
-        Direction.UR: Vec2d.unit().rotated_degrees(-30) * IMPULSE_SCALE,
-        Direction.DL: Vec2d.unit().rotated_degrees(180 - 60) * IMPULSE_SCALE,
-        Direction.D: Vec2d.unit().rotated_degrees(180) * IMPULSE_SCALE,
-        Direction.DR: Vec2d.unit().rotated_degrees(180 + 60) * IMPULSE_SCALE,
-    }
-
-    def __init__(self, level, hud):
-        self.level = level
-        self.hud = hud
-        self.available = None
-        self.reset()
-
-    def reset(self):
-        """Set all directions back to available."""
-        if self.available and not any(self.available.values()):
-            pyglet.clock.unschedule(self.level.fail)
-        self.available = dict.fromkeys(Direction, True)
-        for d in Direction:
-            self.hud.set_available(d, True)
-
-    def all_available(self):
-        """return True if all directions are available."""
-        return all(self.available.values())
-
-    def jump(self, direction):
-        """Request a jump in the given direction."""
-        if level.state is not LevelState.PLAYING:
-            return
-        if self.available[direction]:
-            pc = self.level.pc
-            pc.body.velocity = self.JUMP_IMPULSES[direction]
-            self.available[direction] = False
-            self.hud.set_available(direction, False)
-
-            is_dive = (
-                pc.body.underwater == UnderwaterState.UNDERWATER
-                or pc.body.underwater == UnderwaterState.SURFACE
-                and 'D' in direction.name
-            )
-            sounds.jump(underwater=is_dive)
-            if not any(self.available.values()):
-                pyglet.clock.schedule_once(self.level.fail, 1.3)
-        else:
-            sounds.play('no', volume=0.2)
-            self.hud.warn_unavailable(direction)
-
-
-hud = HUD(WIDTH, HEIGHT)
-controls = JumpController(level, hud)
-
 
 def set_keyhandler(slowmo=False):
     global easy_mode
@@ -350,19 +306,47 @@ def set_keyhandler(slowmo=False):
 
 def exit():
     """Exit the game."""
-    pyglet.clock.unschedule(on_draw)
-    pyglet.clock.unschedule(update_physics)
+    scheduler.stop()
     level.delete()
     pyglet.app.exit()
 
 
+def step_time():
+    """Return the time into this attempt at the level, in physics steps."""
+    return physics_steps * STEP
+
+
 def update_physics(dt):
-    if level.won is not None:
-        return
+    """Advance the physics by the fixed steps that have come due."""
+    global physics_time, physics_steps
+    if slowmo:
+        dt *= 1 / 3
+    physics_time += dt
 
-    steps = 1 if slowmo else 3
-    for _ in range(steps):
-        space.step(1 / 180)
+    recording = controls.recording
+    steps = 0
+    while physics_time >= STEP:
+        if steps == MAX_STEPS:
+            physics_time %= STEP
+            break
+        with timer.phase('physics'):
+            save_states()
+            if level.won is None:
+                Water.apply_buoyancy(STEP)
+                space.step(STEP)
+        physics_time -= STEP
+        steps += 1
+        physics_steps += 1
+
+        if physics_steps % FRAME_STEPS == 0:
+            with timer.phase('water'):
+                Water.update_all(STEP * FRAME_STEPS)
+            level.clock.tick()
+        if recording:
+            recording.record_step()
+
+    # Draw the bodies this far between the last step and the next
+    physics.alpha = physics_time / STEP
 
 
 def clear_handlers():
@@ -383,7 +367,7 @@ class TitleScreen:
 
     def on_key_press(self, symbol, modifiers):
         if symbol == pyglet.window.key.F12:
-            take_screenshot(window)
+            screenshots.take()
             return
         if symbol == pyglet.window.key.ESCAPE:
             exit()
@@ -408,7 +392,7 @@ class GameModeScreen:
 
     def on_key_press(self, symbol, modifiers):
         if symbol == pyglet.window.key.F12:
-            take_screenshot(window)
+            screenshots.take()
             return
 
         if symbol == pyglet.window.key.ESCAPE:
@@ -423,13 +407,30 @@ class GameModeScreen:
         return EVENT_HANDLED
 
 
-def run(level_name=None, slowmo=False):
+def run(level_name=None, slowmo=False, gpu_water=False, record_dir=None,
+        video_path=None, dynamic_resolution=False):
+    global RECORD_DIR, video
+    RECORD_DIR = record_dir
+    resolution.enabled = dynamic_resolution
+    if gpu_water and not Water.use_gpu(mgl):
+        print("GPU water is not supported; using the CPU.")
     if level_name:
         set_keyhandler(slowmo)
         level.load(level_name)
     else:
         TitleScreen().start()
     pyglet.clock.set_fps_limit(60)
-    pyglet.clock.schedule(on_draw)
-    pyglet.clock.schedule(update_physics)
-    pyglet.app.run()
+    scheduler.add_phase(update_physics)
+    scheduler.add_phase(on_draw)
+    scheduler.start()
+    if video_path:
+        size = window.width, window.height
+        video = VideoCapture(
+            mgl, mgl.screen, size, VideoWriter(video_path, size)
+        )
+    try:
+        pyglet.app.run()
+    finally:
+        scheduler.stop()
+        if video:
+            video.close()
@@ -1,4 +1,5 @@
 from contextlib import contextmanager
+from collections import deque
 
 import moderngl
 import numpy as np
@@ -20,13 +21,10 @@ texcoords = np.array([
 
 class OffscreenBuffer:
     def __init__(self, width, height, mgl):
-        size = self.size = width, height
         self.mgl = mgl
-
-        self.fbuf = mgl.framebuffer(
-            [mgl.texture(size, components=3)],
-            mgl.depth_renderbuffer(size)
-        )
+        self.size = None
+        self.fbuf = None
+        self.resize(width, height)
 
         self.shader = mgl.program(
             vertex_shader='''
@@ -62,6 +60,26 @@ class OffscreenBuffer:
             'vert',
         )
 
+    def resize(self, width, height):
+        """Reallocate the framebuffer at the given size.
+
+        Whatever size it is, the scene is stretched to fill it.
+
+        """
+        size = width, height
+        if size == self.size:
+            return
+        if self.fbuf:
+            for attachment in self.fbuf.color_attachments:
+                attachment.release()
+            self.fbuf.depth_attachment.release()
+            self.fbuf.release()
+        self.size = size
+        self.fbuf = self.mgl.framebuffer(
+            [self.mgl.texture(size, components=3)],
+            self.mgl.depth_renderbuffer(size)
+        )
+
     def draw(self):
         with self.bind_texture():
             self.vao.render(moderngl.TRIANGLE_STRIP)
@@ -79,3 +97,98 @@ class OffscreenBuffer:
             yield self.fbuf
         finally:
             self.mgl.screen.use()
+
+
+class StaticLayer(OffscreenBuffer):
+    """An OffscreenBuffer caching the parts of the scene that don't move.
+
+    The layer is drawn once, and then only again after it is invalidated
+    or resized. Each frame it is copied into the scene with draw().
+
+    """
+    def __init__(self, width, height, mgl):
+        self.valid = False
+        super().__init__(width, height, mgl)
+
+    def resize(self, width, height):
+        if (width, height) != self.size:
+            self.valid = False
+        super().resize(width, height)
+
+    def invalidate(self):
+        """Mark the layer to be drawn again before it is next used."""
+        self.valid = False
+
+    def render(self, draw):
+        """Draw the layer by calling draw(), if it is not up to date."""
+        if self.valid:
+            return
+        with self.bind_buffer():
+            draw()
+        self.valid = True
+
+
+class DynamicResolution:
+    """Scale an OffscreenBuffer to keep the GPU time of frames in budget.
+
+    The GPU time of each frame is measured with a timer query. Queries are
+    read a few frames after they were made, by which time their results
+    are ready, so that measuring never stalls the CPU. When the average
+    over the last SAMPLES frames is over BUDGET, the buffer is made
+    smaller; when there is plenty of headroom, it is made larger again, up
+    to the size it was created at.
+
+    """
+    QUERIES = 3
+    SAMPLES = 30
+
+    # Seconds of GPU time a frame may take, leaving time for the rest
+    BUDGET = 0.012
+
+    # Raise the resolution when frames take less than this much of BUDGET
+    HEADROOM = 0.6
+
+    MIN_SCALE = 0.5
+    SCALE_STEP = 0.1
+
+    def __init__(self, offscreen, mgl, enabled=True):
+        self.offscreen = offscreen
+        self.full_size = offscreen.size
+        self.enabled = enabled
+        self.queries = [mgl.query(time=True) for _ in range(self.QUERIES)]
+        self.times = deque(maxlen=self.SAMPLES)
+        self.frame = 0
+        self.resized_at = 0
+        self.scale = 1.0
+
+    @contextmanager
+    def measure(self):
+        """Measure the GPU time of the drawing in the with block."""
+        if not self.enabled:
+            yield
+            return
+        query = self.queries[self.frame % self.QUERIES]
+        # Only use queries made since the last change of resolution
+        if self.frame - self.QUERIES >= self.resized_at:
+            self.times.append(query.elapsed * 1e-9)
+        with query:
+            yield
+        self.frame += 1
+        self.adjust()
+
+    def adjust(self):
+        """Change the resolution if frames are over or well under budget."""
+        if len(self.times) < self.SAMPLES:
+            return
+        average = sum(self.times) / len(self.times)
+        if average > self.BUDGET and self.scale > self.MIN_SCALE:
+            self.scale = max(self.MIN_SCALE, self.scale - self.SCALE_STEP)
+        elif average < self.BUDGET * self.HEADROOM and self.scale < 1:
+            self.scale = min(1.0, self.scale + self.SCALE_STEP)
+        else:
+            return
+        w, h = self.full_size
+        self.offscreen.resize(round(w * self.scale), round(h * self.scale))
+        # Wait for a full set of samples at the new resolution
+        self.times.clear()
+        self.resized_at = self.frame
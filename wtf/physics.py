@@ -11,6 +11,69 @@ WATER_DRAG = 20
 space = pymunk.Space()
 space.gravity = GRAVITY
 
+# Functions that add the collision handlers for the whole game
+handler_setups = []
+
+
+def collision_handlers(func):
+    """Decorator for a function that adds collision handlers to the space.
+
+    The function is called at once, and again whenever the space is reset.
+
+    """
+    handler_setups.append(func)
+    func()
+    return func
+
+
+def reset_space():
+    """Reset the empty space to its initial state.
+
+    Chipmunk numbers the shapes in a space in the order they are added, and
+    the numbers decide the order in which contacts are solved. Loading each
+    level into a fresh space therefore makes it play out identically however
+    many levels were loaded before. The same Space object is kept, as it is
+    imported throughout the game.
+
+    """
+    assert not space.bodies, f"Space contains bodies: {space.bodies}"
+    assert not space.shapes, f"Space contains shapes: {space.shapes}"
+    space.__init__()
+    space.gravity = GRAVITY
+    for setup in handler_setups:
+        setup()
+
+
+# The positions and angles of the bodies before the last physics step, and
+# how far between that and the current state the frame being drawn falls
+previous_states = {}
+alpha = 1.0
+
+
+def save_states():
+    """Record the state of every body, before taking a physics step."""
+    previous_states.clear()
+    for b in space.bodies:
+        previous_states[b] = b.position, b.angle
+
+
+def interpolated(body):
+    """Return the position and angle of body to draw in this frame.
+
+    These are interpolated between the last two physics steps, so that
+    motion looks smooth even though the frame rate and the physics step
+    don't line up.
+
+    """
+    prev = previous_states.get(body)
+    if prev is None:
+        return body.position, body.angle
+    pos, angle = prev
+    return (
+        pos + (body.position - pos) * alpha,
+        angle + (body.angle - angle) * alpha,
+    )
+
 
 # Collision types for callbacks
 COLLISION_TYPE_WATER = 1
@@ -4,13 +4,16 @@ import pyglet.graphics
 from earcut.earcut import earcut
 from pymunk import Poly
 
+from . import HEADLESS
 from .geom import SPACE_SCALE
 from .physics import space
+from .convex import merge_convex
+from .sprites import load_texture
 
 
 class RockPoly:
     batch = pyglet.graphics.Batch()
-    TEX = pyglet.resource.texture('textures/rock.jpg')
+    TEX = load_texture('textures/rock.jpg')
     group = pyglet.sprite.SpriteGroup(
         TEX,
         gl.GL_SRC_ALPHA,
@@ -20,16 +23,31 @@ class RockPoly:
     FRICTION = 1.0
     ELASTICITY = 0.6
 
-    def __init__(self, verts, color=(1, 1, 1), draw=True, friction=None):
-        self.indexes = earcut(verts)
+    # If True, merge triangles into convex pieces for collision; otherwise
+    # add a separate shape for each triangle
+    MERGE_CONVEX = True
 
-        if draw:
+    def __init__(self, verts, color=(1, 1, 1), draw=True, friction=None,
+                 indexes=None, collision_verts=None, hulls=None):
+        """Create a rock.
+
+        verts is the outline that is drawn, and indexes its triangulation.
+        The collision shapes are made from collision_verts, if given, which
+        is usually a simpler outline; hulls are convex pieces of it, as
+        lists of vertex indices.
+
+        """
+        if indexes is None:
+            indexes = earcut(verts)
+        self.indexes = np.asarray(indexes, dtype=np.int32)
+
+        if draw and not HEADLESS:
             size = len(verts) // 2
             self.dl = self.batch.add_indexed(
                 size,
                 gl.GL_TRIANGLES,
                 self.group,
-                self.indexes,
+                self.indexes.tolist(),
                 ('v2f/static', np.array(verts) / SPACE_SCALE),
                 ('t2f/static', np.array(verts) / (512 * SPACE_SCALE * 2)),
                 ('c3f/static', [c for _ in range(size) for c in color]),
@@ -38,10 +56,23 @@ class RockPoly:
             self.dl = None
 
         self.shapes = []
-        verts = np.array(verts)
-        tris = verts.reshape(-1, 2)[self.indexes].reshape(-1, 3, 2)
-        for tri in tris:
-            shp = Poly(space.static_body, tri)
+        if collision_verts is None:
+            collision_verts = verts
+            collision_indexes = self.indexes
+        else:
+            collision_indexes = None
+        verts = np.array(collision_verts).reshape(-1, 2)
+        if hulls is None or not self.MERGE_CONVEX:
+            if collision_indexes is None:
+                collision_indexes = np.asarray(
+                    earcut(verts.reshape(-1)), dtype=np.int32
+                )
+            if not self.MERGE_CONVEX:
+                hulls = collision_indexes.reshape(-1, 3)
+            else:
+                hulls = merge_convex(verts, collision_indexes)
+        for hull in hulls:
+            shp = Poly(space.static_body, verts[hull])
             shp.friction = friction or self.FRICTION
             shp.elasticity = self.ELASTICITY
             space.add(shp)
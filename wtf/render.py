@@ -0,0 +1,86 @@
+"""Render levels offscreen, for tools that make pictures and videos.
+
+pyglet's batches need a pyglet GL context rather than a standalone one, so
+LevelRenderer creates a window that is never shown, and gives its context
+to moderngl. The scene is drawn as in the game, without the HUD.
+
+"""
+import pyglet
+import pyglet.resource
+import pyglet.sprite
+from pyglet import gl
+import moderngl
+from pyrr import Matrix44
+
+from . import PIXEL_SCALE
+from .geom import WIDTH, HEIGHT, SPACE_SCALE
+from .offscreen import OffscreenBuffer
+from .water import WaterBatch
+from .poly import RockPoly
+from .actors import actor_sprites
+from .sprites import load_image
+
+
+class LevelRenderer:
+    """Draw a level into a framebuffer, using a hidden window.
+
+    level is the Level to draw, which is stepped elsewhere, usually by a
+    Simulation. output is the framebuffer that each frame is drawn into; it
+    is the size of the game window.
+
+    """
+    def __init__(self, level):
+        self.size = round(WIDTH * PIXEL_SCALE), round(HEIGHT * PIXEL_SCALE)
+        self.window = pyglet.window.Window(*self.size, visible=False)
+        self.mgl = moderngl.create_context()
+        self.offscreen = OffscreenBuffer(*self.size, self.mgl)
+        self.output = self.mgl.simple_framebuffer(self.size, components=3)
+        self.water_batch = WaterBatch(self.mgl)
+        self.background = pyglet.sprite.Sprite(
+            load_image('backgrounds/default.jpg')
+        )
+        self.level = level
+        self.mvp = Matrix44.orthogonal_projection(
+            0, WIDTH * SPACE_SCALE,
+            0, HEIGHT * SPACE_SCALE,
+            -1, 1,
+            dtype='f4'
+        )
+
+    def set_background(self, name):
+        """Show the background of the given level."""
+        try:
+            img = load_image(f'backgrounds/{name}.jpg')
+        except pyglet.resource.ResourceNotFoundException:
+            img = load_image('backgrounds/default.jpg')
+        self.background.image = img
+
+    def draw(self, dt=0):
+        """Draw the level into the output framebuffer."""
+        with self.offscreen.bind_buffer() as fbuf:
+            fbuf.clear(0.13, 0.1, 0.1)
+            # The window was never shown, so set up the projection that
+            # pyglet would have on resizing it; the scene is drawn in
+            # unscaled screen coordinates
+            gl.glMatrixMode(gl.GL_PROJECTION)
+            gl.glLoadIdentity()
+            gl.glOrtho(0, WIDTH, 0, HEIGHT, -1, 1)
+            gl.glMatrixMode(gl.GL_MODELVIEW)
+            gl.glLoadIdentity()
+            self.background.draw()
+            RockPoly.batch.draw()
+            actor_sprites.draw()
+            self.level.fg_batch.draw()
+
+        self.output.use()
+        self.output.clear()
+        self.offscreen.draw()
+        with self.offscreen.bind_texture(location=0):
+            self.water_batch.tex_uniform.value = 0
+            self.water_batch.render(dt, self.mvp)
+        gl.glUseProgram(0)
+        gl.glBindVertexArray(0)
+
+    def read(self):
+        """Read the output framebuffer, as RGB bytes from the bottom up."""
+        return self.output.read(components=3)
@@ -0,0 +1,113 @@
+"""Recording and replaying play sessions.
+
+A recording holds the jumps made during one attempt at a level, each
+against the index of the physics step it was made before, and a hash of
+the physics state after every step. Replaying feeds the same jumps into a
+headless Simulation at the same steps, and compares the hashes to find the
+first step at which the replay diverged from the recording.
+
+The game steps the physics and the water on the same fixed schedule as
+the Simulation, whatever its frame rate, so recordings made by either
+replay exactly.
+
+"""
+import hashlib
+
+import numpy as np
+
+from .physics import space
+from .directions import Direction
+
+
+FORMAT_VERSION = 1
+
+DIRECTIONS = list(Direction)
+
+
+def state_hash():
+    """Return a 64-bit hash of the positions and velocities of all bodies.
+
+    pymunk keeps the bodies in a set, whose order differs from one process
+    to the next, so the bodies are hashed in order of their state.
+
+    """
+    state = np.array(sorted(
+        (*b.position, *b.velocity, b.angle, b.angular_velocity)
+        for b in space.bodies
+    ))
+    digest = hashlib.blake2b(state.tobytes(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class Recording:
+    """The inputs and per-step state hashes of an attempt at a level."""
+
+    def __init__(self, level_name, easy=False):
+        self.level_name = level_name
+        self.easy = easy
+        self.jumps = []  # (step, direction) pairs
+        self.hashes = []
+
+    @property
+    def steps(self):
+        """The number of physics steps recorded."""
+        return len(self.hashes)
+
+    def jump(self, direction):
+        """Record a jump, to be made before the next step."""
+        self.jumps.append((self.steps, direction))
+
+    def record_step(self):
+        """Record the state after a physics step."""
+        self.hashes.append(state_hash())
+
+    def save(self, path):
+        """Save the recording to the given path."""
+        steps = [s for s, _ in self.jumps]
+        dirs = [DIRECTIONS.index(d) for _, d in self.jumps]
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.array(FORMAT_VERSION),
+                level_name=np.array(self.level_name),
+                mode=np.array('easy' if self.easy else 'normal'),
+                jump_steps=np.array(steps, dtype=np.uint32),
+                jump_directions=np.array(dirs, dtype=np.uint8),
+                hashes=np.array(self.hashes, dtype=np.uint64),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Load a recording from the given path."""
+        with np.load(path) as npz:
+            if npz['version'] != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a supported recording")
+            easy = bool(npz['mode'] == 'easy')
+            rec = cls(str(npz['level_name']), easy=easy)
+            rec.jumps = [
+                (int(s), DIRECTIONS[d])
+                for s, d in zip(npz['jump_steps'], npz['jump_directions'])
+            ]
+            rec.hashes = npz['hashes'].tolist()
+        return rec
+
+
+def replay(recording, sim):
+    """Replay a recording in a Simulation, checking it step by step.
+
+    Return the index of the first step whose state differs from the
+    recording, or None if the replay matched throughout.
+
+    """
+    sim.load(recording.level_name)
+
+    jumps = iter(recording.jumps)
+    next_jump = next(jumps, None)
+    for i, expected in enumerate(recording.hashes):
+        while next_jump and next_jump[0] == i:
+            sim.jump(next_jump[1])
+            next_jump = next(jumps, None)
+        sim.step()
+        if state_hash() != expected:
+            return i
+    return None
@@ -1,14 +1,12 @@
 import math
 
 import pymunk
-import pyglet.resource
-import pyglet.sprite
 import pyglet.graphics
 from pymunk import Vec2d
 
 from .geom import phys_to_screen, SPACE_SCALE
-from .sprites import load_centered
-from .physics import box, space, cbox
+from .sprites import Sprite, load_centered, load_image
+from .physics import box, space, cbox, interpolated
 from .actors import actor_sprites
 
 
@@ -30,7 +28,7 @@ class Scenery:
         Here x and y are in physics coordinates.
 
         """
-        self.sprite = pyglet.sprite.Sprite(self.SPRITE, batch=actor_sprites)
+        self.sprite = Sprite(self.SPRITE, batch=actor_sprites)
         self.sprite.position = phys_to_screen(x, y)
 
         shape = box(
@@ -48,7 +46,7 @@ class Scenery:
 
 
 class Platform(Scenery):
-    SPRITE = pyglet.resource.image('sprites/platform.png')
+    SPRITE = load_image('sprites/platform.png')
     DIMS = (3, 1)
 
 
@@ -58,7 +56,7 @@ class Lilypad(Scenery):
 
     def __init__(self, x, y):
         y += 1
-        self.sprite = pyglet.sprite.Sprite(self.SPRITE, batch=actor_sprites)
+        self.sprite = Sprite(self.SPRITE, batch=actor_sprites)
         self.sprite.position = phys_to_screen(x, y)
 
         self.body = pymunk.Body(40, pymunk.inf)
@@ -77,8 +75,9 @@ class Lilypad(Scenery):
         space.add(self.body, self.shape)
 
     def update(self, dt):
-        self.sprite.position = self.body.position / SPACE_SCALE
-        self.sprite.rotation = math.degrees(self.body.angle)
+        pos, angle = interpolated(self.body)
+        self.sprite.position = pos / SPACE_SCALE
+        self.sprite.rotation = math.degrees(angle)
 
     def delete(self):
         self.sprite.delete()
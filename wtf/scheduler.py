@@ -0,0 +1,64 @@
+"""The frame loop, and a queue of work to do when frames have time to spare.
+
+Each frame runs its phases in order. Work that isn't needed this frame -
+saving progress, or loading assets before they are first used - is
+deferred, and done in whatever time the frame has left, so that it never
+makes a frame late.
+
+"""
+from time import perf_counter
+from collections import deque
+
+import pyglet.clock
+
+
+# The time a frame may take at 60fps
+FRAME_BUDGET = 1 / 60
+
+# Deferred work is only started if this much of the frame remains, because
+# there's no telling how long it will take
+IDLE_MARGIN = 0.004
+
+
+class FrameScheduler:
+    """Run the phases of each frame, then deferred work while time allows."""
+
+    def __init__(self, budget=FRAME_BUDGET):
+        self.budget = budget
+        self.phases = []
+        self.deferred = deque()
+
+    def add_phase(self, func):
+        """Add a function to call with dt in each frame, after the others."""
+        self.phases.append(func)
+
+    def defer(self, func, *args):
+        """Call func(*args) in the spare time of some later frame."""
+        self.deferred.append((func, args))
+
+    def tick(self, dt):
+        start = perf_counter()
+        for phase in self.phases:
+            phase(dt)
+        deadline = start + self.budget - IDLE_MARGIN
+        while self.deferred and perf_counter() < deadline:
+            func, args = self.deferred.popleft()
+            func(*args)
+
+    def flush(self):
+        """Do all the deferred work now."""
+        while self.deferred:
+            func, args = self.deferred.popleft()
+            func(*args)
+
+    def start(self):
+        """Start running frames on the pyglet clock."""
+        pyglet.clock.schedule(self.tick)
+
+    def stop(self):
+        pyglet.clock.unschedule(self.tick)
+        self.flush()
+
+
+scheduler = FrameScheduler()
+defer = scheduler.defer
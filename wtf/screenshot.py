@@ -1,37 +1,95 @@
+"""Screenshots of the game window.
+
+Reading the window back synchronously stalls until the GPU has finished
+drawing the frame, and encoding a PNG takes longer still, so neither is
+done on the main thread while the game waits. The window is copied into a
+pixel buffer object at the end of the frame in which the screenshot was
+taken; a frame later the copy has finished, and the pixels are handed to a
+worker thread to encode and save.
+
+"""
+import re
 import datetime
 import pathlib
-from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame.image
+import pygame.transform
+
+
+GRABS_PATH = pathlib.Path('grabs')
 
-from pyglet import gl
-import pyglet.image
+# The next free screenshot number, by competition day
+grab_numbers = {}
+
+encoder = ThreadPoolExecutor(max_workers=1)
 
 
 def screenshot_path(comp_start=datetime.date(2019, 3, 24)):
-    """Get a path to save a screenshot into."""
+    """Get a path to save a screenshot into.
+
+    The grabs directory is only scanned for the first screenshot of each
+    day; after that the numbers are allocated in turn.
+
+    """
     today = datetime.date.today()
     comp_day = (today - comp_start).days + 1
-    grabs = pathlib.Path('grabs')
 
-    for n in count(1):
-        p = grabs / f'day{comp_day}-{n}.png'
-        if not p.exists():
-            return str(p)
+    n = grab_numbers.get(comp_day)
+    if n is None:
+        pattern = re.compile(rf'day{comp_day}-(\d+)\.png')
+        taken = [0]
+        for p in GRABS_PATH.glob(f'day{comp_day}-*.png'):
+            mo = pattern.fullmatch(p.name)
+            if mo:
+                taken.append(int(mo.group(1)))
+        n = max(taken) + 1
+    grab_numbers[comp_day] = n + 1
+    return str(GRABS_PATH / f'day{comp_day}-{n}.png')
 
 
-def take_screenshot(window, path=None):
-    """Take a screenshot of the given window.
+def save_png(pixels, size, path):
+    """Save RGB pixels, read bottom up from GL, as a PNG."""
+    image = pygame.image.frombuffer(pixels, size, 'RGB')
+    image = pygame.transform.flip(image, False, True)
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    pygame.image.save(image, path)
 
-    Save it to a new path returned by screenshot_path.
 
-    """
-    # disable transfer alpha channel
-    gl.glPixelTransferf(gl.GL_ALPHA_BIAS, 1.0)
-    image = pyglet.image.ColorBufferImage(
-        0,
-        0,
-        window.width,
-        window.height
-    )
-    image.save(path or screenshot_path())
-    # re-enable alpha channel transfer
-    gl.glPixelTransferf(gl.GL_ALPHA_BIAS, 0.0)
+class ScreenshotCapture:
+    """Capture screenshots of the window without stalling the game."""
+
+    def __init__(self, window, mgl):
+        self.window = window
+        self.mgl = mgl
+        self.requested = []  # paths to capture at the end of this frame
+        self.reading = []  # (buffer, size, path) being read back
+
+    def take(self, path=None):
+        """Take a screenshot of the window once the frame has been drawn.
+
+        It is saved to path, or a new path returned by screenshot_path.
+
+        """
+        self.requested.append(path or screenshot_path())
+
+    def end_frame(self):
+        """Start reading back any screenshots taken during this frame.
+
+        Screenshots started in the previous frame have been read back by
+        now, and are sent to be encoded.
+
+        """
+        for buf, size, path in self.reading:
+            encoder.submit(save_png, buf.read(), size, path)
+            buf.release()
+        self.reading.clear()
+
+        size = self.window.width, self.window.height
+        for path in self.requested:
+            buf = self.mgl.buffer(reserve=size[0] * size[1] * 3)
+            self.mgl.screen.read_into(
+                buf, viewport=(0, 0, *size), components=3
+            )
+            self.reading.append((buf, size, path))
+        self.requested.clear()
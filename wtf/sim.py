@@ -0,0 +1,84 @@
+"""Headless simulation of the game world.
+
+This runs levels in a Simulation (see wtf.simulation), as fast as the CPU
+allows, without opening a window, creating a GL context or playing sounds.
+Jumps are requested programmatically through the level's JumpController.
+
+Import this module before any other part of the game; it switches the
+package into headless mode, which cannot be undone within the process.
+
+"""
+import pyglet
+
+# Don't let pyglet.gl create a hidden window (and connect to a display)
+pyglet.options['shadow_window'] = False
+
+import wtf
+wtf.HEADLESS = True
+
+import time
+from argparse import ArgumentParser, ArgumentTypeError
+
+from .simulation import Simulation
+from .directions import Direction
+from .replay import Recording
+
+
+def direction(name):
+    """Parse the name of a Direction, for the command line."""
+    try:
+        return Direction[name]
+    except KeyError:
+        names = ', '.join(d.name for d in Direction)
+        raise ArgumentTypeError(
+            f"invalid direction {name!r} (choose from {names})"
+        ) from None
+
+
+def main():
+    parser = ArgumentParser(
+        description="Simulate a level headlessly with a sequence of jumps."
+    )
+    parser.add_argument('level', help="The level to simulate.")
+    parser.add_argument(
+        'jumps',
+        nargs='*',
+        type=direction,
+        metavar='JUMP',
+        help="Jumps to make, in order; one of "
+             f"{', '.join(d.name for d in Direction)}."
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=1.0,
+        help="Seconds of simulated time between jumps."
+    )
+    parser.add_argument(
+        '--record',
+        metavar='PATH',
+        help="Save a recording of the run, for wtf.replay."
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sim = Simulation(args.level)
+    if args.record:
+        sim.record(Recording(args.level))
+    for d in args.jumps:
+        sim.run(args.interval)
+        sim.jump(d)
+    sim.run_until_done()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.level}: {sim.level.state.name}, {sim.level.stars} stars")
+    print(
+        f"{sim.steps} steps in {elapsed:.3f}s "
+        f"({sim.steps / elapsed:.0f} steps/s)"
+    )
+    if args.record:
+        sim.recording.save(args.record)
+
+
+if __name__ == '__main__':
+    main()
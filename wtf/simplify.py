@@ -0,0 +1,80 @@
+"""Simplification of polygon outlines.
+
+Outlines drawn in Inkscape (and curves flattened by wtf.svg_path) often
+have far more vertices than the game needs. Every vertex costs time in
+triangulation, and adds to the triangles drawn and the collision shapes
+in the physics space.
+
+This uses the Ramer-Douglas-Peucker algorithm, which keeps the vertices
+needed for the simplified outline to stay within a tolerance of the
+original.
+
+"""
+import numpy as np
+
+
+def simplify_polyline(points, tolerance):
+    """Simplify an open polyline, given as an (n, 2) array.
+
+    Return a boolean mask of the points to keep. The end points are always
+    kept.
+
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        seg = points[b] - points[a]
+        rel = points[a + 1:b] - points[a]
+        length = np.hypot(*seg)
+        if length:
+            dists = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        else:
+            dists = np.hypot(rel[:, 0], rel[:, 1])
+        i = int(np.argmax(dists))
+        if dists[i] > tolerance:
+            i += a + 1
+            keep[i] = True
+            stack.append((a, i))
+            stack.append((i, b))
+    return keep
+
+
+def simplify_loop(points, tolerance, max_verts=None):
+    """Simplify a closed polygon outline, given as an (n, 2) array.
+
+    Return the simplified outline. If max_verts is given, the tolerance is
+    doubled until the outline has no more vertices than that. Outlines that
+    would be simplified to fewer than three vertices are returned
+    unchanged.
+
+    """
+    simplified = _simplify_loop(points, tolerance)
+    while max_verts and len(simplified) > max_verts and tolerance > 0:
+        tolerance *= 2
+        simplified = _simplify_loop(points, tolerance)
+        if simplified is points:
+            break  # can't be simplified any further
+    return simplified
+
+
+def _simplify_loop(points, tolerance):
+    if len(points) <= 3 or tolerance <= 0:
+        return points
+
+    # Split the loop at the vertex furthest from the first, so that each
+    # half is an open polyline that keeps both of those
+    far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    if not far:
+        return points
+    ring = np.vstack([points, points[:1]])
+    keep = np.concatenate([
+        simplify_polyline(ring[:far + 1], tolerance),
+        simplify_polyline(ring[far:], tolerance)[1:],
+    ])[:-1]
+    if keep.sum() < 3:
+        return points
+    return points[keep]
@@ -0,0 +1,108 @@
+"""Stepping the game world at a fixed time step.
+
+Simulation is the one implementation of the order in which the physics,
+the water and the actors are stepped, shared by the headless simulation
+(see wtf.sim) and the tools that render levels offscreen, so that they all
+play out identically. The game steps on the same schedule, with
+interpolation between steps (see wtf.main).
+
+"""
+import pyglet.clock
+
+from .physics import space
+from .water import Water
+from .level import Level
+
+
+# The physics time step, and the number of steps per 60Hz frame, in which
+# the water and the actors are updated
+STEP = 1 / 180
+FRAME_STEPS = 3
+
+
+class Simulation:
+    """Simulate a level at a fixed time step.
+
+    Physics steps at STEP, as in the game. Water and actors are updated
+    once every FRAME_STEPS steps, matching the game's 60Hz frame updates,
+    so that the ripples (and hence the buoyancy) behave identically.
+
+    If a Recording is given to record(), the jumps and the state after
+    every step are recorded.
+
+    """
+    STEP = STEP
+    FRAME_STEPS = FRAME_STEPS
+
+    def __init__(self, level_name=None):
+        self.steps = 0
+        self.clock = pyglet.clock.Clock(time_function=self.time)
+        self.level = Level(clock=self.clock)
+        self.controls = self.level.controls
+        self.recording = None
+        if level_name:
+            self.load(level_name)
+
+    def time(self):
+        """Return the simulated time, for use as the clock's time function."""
+        return self.steps * self.STEP
+
+    def load(self, level_name):
+        """Load the given level, restarting the step count and the clock.
+
+        Events are scheduled relative to the last tick of the clock, so a
+        new clock, starting from zero, makes them happen at the same steps
+        however long the simulation has run.
+
+        """
+        self.steps = 0
+        self.clock = self.level.clock = pyglet.clock.Clock(
+            time_function=self.time
+        )
+        self.level.load(level_name)
+
+    def record(self, recording):
+        """Record the jumps and state hashes into the given Recording."""
+        self.recording = self.controls.recording = recording
+
+    def jump(self, direction):
+        """Request a jump in the given direction."""
+        self.controls.jump(direction)
+
+    def step(self):
+        """Advance the simulation by one fixed time step."""
+        if self.level.won is None:
+            Water.apply_buoyancy(self.STEP)
+            space.step(self.STEP)
+        self.steps += 1
+
+        if self.steps % self.FRAME_STEPS == 0:
+            dt = self.STEP * self.FRAME_STEPS
+            for a in self.level.actors:
+                a.update(dt)
+            Water.update_all(dt)
+            self.clock.tick()
+
+        if self.recording:
+            self.recording.record_step()
+
+    def run(self, seconds):
+        """Advance the simulation by the given number of seconds."""
+        for _ in range(round(seconds / self.STEP)):
+            self.step()
+
+    def run_until_done(self, max_seconds=60):
+        """Run until the level is won or lost, or max_seconds elapse.
+
+        Return True if the level finished.
+
+        """
+        for _ in range(round(max_seconds / self.STEP)):
+            if self.level.won is not None:
+                return True
+            self.step()
+        return self.level.won is not None
+
+    def delete(self):
+        """Remove the level from the physics space."""
+        self.level.delete()
@@ -2,19 +2,25 @@
 
 We use Pygame for audio because Pyglet's audio has proven to be unstable
 in many previous PyWeeks.
+
+When running headless no audio device is opened and sounds are discarded.
 """
 import os
 import random
 from functools import lru_cache
 import pyglet.resource
 
+from . import HEADLESS, ASSETS_PATH
+from .scheduler import defer
+
 # Don't show Pygame's annoying message because while I might use PyGame,
 # I don't appreciate libraries I use communicating with my users.
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
 import pygame.mixer
 
-pygame.mixer.pre_init(44000, 16, 2)
-pygame.mixer.init()
+if not HEADLESS:
+    pygame.mixer.pre_init(44000, 16, 2)
+    pygame.mixer.init()
 
 
 AMBIENT_FILE = "sounds/ambient.ogg"
@@ -33,30 +39,38 @@ def load(name):
 
 def play(name, volume=1.0):
     """Play a sound file."""
+    if HEADLESS:
+        return
     s = load(name)
     s.set_volume(volume)
     s.play()
 
 
-JUMPS = [
-    load('jump1'),
-    load('jump2'),
-    load('jump3'),
-]
-JUMPS_UW = [
-    load('jump-uw1'),
-    load('jump-uw2'),
-]
-
-for s in JUMPS + JUMPS_UW:
-    s.set_volume(JUMP_SOUND_VOLUME)
-
-
 def jump(underwater=False):
     """Play a random jump sound."""
+    if HEADLESS:
+        return
     random.choice(JUMPS_UW if underwater else JUMPS).play()
 
 
-music_file = pyglet.resource.file(AMBIENT_FILE, 'rb')
-pygame.mixer.music.load(music_file)
-pygame.mixer.music.play(loops=-1)
+if not HEADLESS:
+    JUMPS = [
+        load('jump1'),
+        load('jump2'),
+        load('jump3'),
+    ]
+    JUMPS_UW = [
+        load('jump-uw1'),
+        load('jump-uw2'),
+    ]
+
+    for s in JUMPS + JUMPS_UW:
+        s.set_volume(JUMP_SOUND_VOLUME)
+
+    # Load the other sounds ahead of time, so that playing one doesn't stall
+    for f in sorted(ASSETS_PATH.glob('sounds/*.wav')):
+        defer(load, f.stem)
+
+    music_file = pyglet.resource.file(AMBIENT_FILE, 'rb')
+    pygame.mixer.music.load(music_file)
+    pygame.mixer.music.play(loops=-1)
@@ -1,14 +1,201 @@
+import json
+import struct
+
 import pyglet.resource
+import pyglet.sprite
+import pyglet.image
 
+from . import HEADLESS
 
-def load_centered(name, group='sprites'):
-    try:
-        img = pyglet.resource.image(f'{group}/{name}.png')
-    except pyglet.resource.ResourceNotFoundException as e:
+
+class HeadlessImage:
+    """An image that has dimensions but no texture.
+
+    This stands in for pyglet images when running headless, where there is
+    no GL context to upload textures to.
+
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.anchor_x = 0
+        self.anchor_y = 0
+
+    def get_region(self, x, y, width, height):
+        return HeadlessImage(width, height)
+
+
+class HeadlessSprite:
+    """A sprite that tracks its attributes but draws nothing."""
+
+    def __init__(self, img, x=0, y=0, batch=None, group=None, usage='dynamic'):
+        self.image = img
+        self.x = x
+        self.y = y
+        self.rotation = 0
+        self.scale = 1
+        self.scale_x = 1
+        self.scale_y = 1
+        self.color = (255, 255, 255)
+        self.opacity = 255
+
+    @property
+    def position(self):
+        return self.x, self.y
+
+    @position.setter
+    def position(self, pos):
+        self.x, self.y = pos
+
+    def update(self, x=None, y=None, rotation=None, scale=None,
+               scale_x=None, scale_y=None):
+        if x is not None:
+            self.x = x
+        if y is not None:
+            self.y = y
+        if rotation is not None:
+            self.rotation = rotation
+        if scale is not None:
+            self.scale = scale
+        if scale_x is not None:
+            self.scale_x = scale_x
+        if scale_y is not None:
+            self.scale_y = scale_y
+
+    def delete(self):
+        pass
+
+
+Sprite = HeadlessSprite if HEADLESS else pyglet.sprite.Sprite
+
+
+def image_size(path):
+    """Read the dimensions of a PNG or JPEG resource from its header."""
+    with pyglet.resource.file(path, 'rb') as f:
+        header = f.read(24)
+        if header[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', header[16:24])
+
+        # Walk the JPEG segments looking for a start-of-frame marker
+        f.seek(2)
+        while True:
+            marker, size = struct.unpack('>HH', f.read(4))
+            if 0xffc0 <= marker <= 0xffcf and \
+                    marker not in (0xffc4, 0xffc8, 0xffcc):
+                h, w = struct.unpack('>xHH', f.read(5))
+                return w, h
+            f.seek(size - 2, 1)
+
+
+# Textures loaded with load_image, by resource path
+textures = {}
+
+# The manifest of the texture atlas built by tools/build_atlas.py, if any
+ATLAS_MANIFEST = 'atlas/manifest.json'
+atlas = None
+
+
+def load_atlas():
+    """Load the atlas manifest, returning its regions by resource path."""
+    global atlas
+    if atlas is None:
         try:
-            img = pyglet.resource.image(f'{group}/{name}.jpg')
+            with pyglet.resource.file(ATLAS_MANIFEST, 'r') as f:
+                atlas = json.load(f)
         except pyglet.resource.ResourceNotFoundException:
-            raise e from None
+            atlas = {'pages': [], 'regions': {}}
+    return atlas['regions']
+
+
+def atlas_region(path):
+    """Return the atlas region holding the image resource, or None."""
+    region = load_atlas().get(path)
+    if region is None:
+        return None
+    page = pyglet.resource.texture(atlas['pages'][region['page']])
+    return page.get_region(
+        region['x'], region['y'], region['width'], region['height']
+    )
+
+
+# Images decoded ahead of time by preload_image, by resource path
+decoded_images = {}
+
+
+def discard_preloaded(paths):
+    """Drop images decoded by preload_image that won't be loaded after all."""
+    for path in paths:
+        decoded_images.pop(path, None)
+
+
+def preload_image(path):
+    """Decode an image resource, so that load_image need only upload it.
+
+    This doesn't touch GL, so it can be called from a worker thread.
+
+    """
+    if HEADLESS or path in textures or path in decoded_images:
+        return
+    if path in load_atlas():
+        return
+    with pyglet.resource.file(path, 'rb') as f:
+        decoded_images[path] = pyglet.image.load(path, file=f)
+
+
+def load_image(path):
+    """Load an image resource, or just its dimensions if headless."""
+    if HEADLESS:
+        return HeadlessImage(*image_size(path))
+    try:
+        return textures[path]
+    except KeyError:
+        pass
+    img = decoded_images.pop(path, None)
+    if img is not None:
+        img = img.get_texture()
+    else:
+        img = atlas_region(path) or pyglet.resource.image(path)
+    textures[path] = img
+    return img
+
+
+def load_texture(path):
+    """Load a texture resource, or just its dimensions if headless."""
+    if HEADLESS:
+        return HeadlessImage(*image_size(path))
+    return pyglet.resource.texture(path)
+
+
+def load_grid(path, rows, columns):
+    """Load an image as a sequence of centered animation frames."""
+    img = load_image(path)
+    if HEADLESS:
+        frame = HeadlessImage(img.width // columns, img.height // rows)
+        return [center(frame)] * (rows * columns)
+    return center(
+        pyglet.image.ImageGrid(img, rows, columns).get_texture_sequence()
+    )
+
+
+def find_image(stem, load=load_image):
+    """Load an image that may be a PNG or a JPEG, preferring a PNG.
+
+    stem is the resource path without an extension. load is called with the
+    path of each candidate in turn; return the path that was found, and
+    what load returned for it.
+
+    """
+    error = None
+    for path in (f'{stem}.png', f'{stem}.jpg'):
+        try:
+            return path, load(path)
+        except pyglet.resource.ResourceNotFoundException as e:
+            error = error or e
+    raise error
+
+
+def load_centered(name, group='sprites'):
+    _, img = find_image(f'{group}/{name}')
     img.anchor_x = img.width // 2
     img.anchor_y = img.height // 2
     return img
@@ -0,0 +1,257 @@
+"""Parse SVG path data into arrays of vertices.
+
+The whole SVG path grammar is supported: all commands in absolute and
+relative forms, implicitly repeated arguments, and smooth curves that
+reflect the previous control point. Curves and elliptical arcs are
+flattened to line segments that deviate from the true curve by no more
+than a tolerance.
+
+A path is tokenized in a single pass of a compiled regex, which splits it
+into commands and their argument strings. The arguments of each command
+are converted to a NumPy array at once, so that runs of line segments
+(which is almost all of what Inkscape writes) never touch Python floats.
+
+"""
+import re
+from math import atan2, acos, ceil, cos, sin, sqrt, radians, pi
+
+import numpy as np
+
+
+# Maximum distance of flattened curves from the true curve, in SVG units
+CURVE_TOLERANCE = 0.5
+
+NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+SEP = r'[\s,]*'
+
+COMMANDS = 'MmZzLlHhVvCcSsQqTtAa'
+
+PATH_COMMAND = re.compile(f'([{COMMANDS}])([^{COMMANDS}]*)')
+PATH_ARGS = re.compile(rf'(?:{SEP}{NUMBER})*{SEP}')
+NUMBERS = re.compile(NUMBER)
+
+# Arc flags are single digits, which needn't be separated from what follows
+ARC_ARGS = re.compile(
+    SEP
+    + SEP.join([f'({NUMBER})'] * 3 + ['([01])'] * 2 + [f'({NUMBER})'] * 2)
+    + SEP
+)
+
+# Number of arguments taken by each command
+ARITY = {
+    'm': 2, 'l': 2, 'h': 1, 'v': 1,
+    'c': 6, 's': 4, 'q': 4, 't': 2,
+    'a': 7, 'z': 0,
+}
+
+# Binomial coefficients for Bézier curves, by degree
+BINOMIALS = {
+    2: np.array([1, 2, 1]),
+    3: np.array([1, 3, 3, 1]),
+}
+
+
+def parse_args(cmd, args, path_str):
+    """Parse the arguments of a command, as rows of numbers."""
+    op = cmd.lower()
+    if op == 'a':
+        rows = []
+        pos = 0
+        while pos < len(args):
+            mo = ARC_ARGS.match(args, pos)
+            if not mo or mo.end() == pos:
+                break
+            rows.append(mo.groups())
+            pos = mo.end()
+        if pos != len(args) and args[pos:].strip(' \t\r\n,'):
+            raise ValueError(f"Couldn't parse arc {args!r} in {path_str!r}")
+        nums = np.array(rows, dtype=float)
+    else:
+        if not PATH_ARGS.fullmatch(args):
+            raise ValueError(
+                f"Couldn't parse {cmd}{args!r} in {path_str!r}"
+            )
+        nums = np.array(NUMBERS.findall(args), dtype=float)
+
+    arity = ARITY[op]
+    if not arity:
+        if nums.size:
+            raise ValueError(f"{cmd} takes no arguments in {path_str!r}")
+        return nums
+    if not nums.size or nums.size % arity:
+        raise ValueError(
+            f"{cmd} needs a multiple of {arity} numbers in {path_str!r}"
+        )
+    return nums.reshape(-1, arity)
+
+
+def flatten_bezier(points, tolerance):
+    """Flatten a quadratic or cubic Bézier curve into line segments.
+
+    points are the control points, including the start point. Return the
+    vertices after the start point, ending at the end point.
+
+    """
+    degree = len(points) - 1
+    # Wang's formula for the number of segments within tolerance
+    second_diffs = points[2:] - 2 * points[1:-1] + points[:-2]
+    m = np.sqrt((second_diffs ** 2).sum(axis=1)).max()
+    n = max(1, ceil(sqrt(degree * (degree - 1) / 8 * m / tolerance)))
+
+    t = np.linspace(0, 1, n + 1)[1:, np.newaxis]
+    i = np.arange(degree + 1)
+    basis = BINOMIALS[degree] * t ** i * (1 - t) ** (degree - i)
+    verts = basis @ points
+    verts[-1] = points[-1]
+    return verts
+
+
+def flatten_arc(start, rx, ry, angle, large_arc, sweep, end, tolerance):
+    """Flatten an SVG elliptical arc into line segments.
+
+    Return the vertices after the start point, ending at the end point.
+    This follows the endpoint to center conversion in the SVG spec.
+
+    """
+    if np.array_equal(start, end):
+        return np.zeros((0, 2))
+    rx = abs(rx)
+    ry = abs(ry)
+    if not rx or not ry:
+        return end[np.newaxis]
+
+    phi = radians(angle)
+    c = cos(phi)
+    s = sin(phi)
+    dx, dy = (start - end) / 2
+    x1 = c * dx + s * dy
+    y1 = -s * dx + c * dy
+
+    # Scale up radii that are too small to span the endpoints
+    scale = (x1 / rx) ** 2 + (y1 / ry) ** 2
+    if scale > 1:
+        rx *= sqrt(scale)
+        ry *= sqrt(scale)
+
+    rx2, ry2 = rx * rx, ry * ry
+    num = rx2 * ry2 - rx2 * y1 * y1 - ry2 * x1 * x1
+    den = rx2 * y1 * y1 + ry2 * x1 * x1
+    k = sqrt(max(0, num / den))
+    if large_arc == sweep:
+        k = -k
+    cx1 = k * rx * y1 / ry
+    cy1 = -k * ry * x1 / rx
+    mx, my = (start + end) / 2
+    cx = c * cx1 - s * cy1 + mx
+    cy = s * cx1 + c * cy1 + my
+
+    theta = atan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    dtheta = atan2((-y1 - cy1) / ry, (-x1 - cx1) / rx) - theta
+    if sweep and dtheta < 0:
+        dtheta += 2 * pi
+    elif not sweep and dtheta > 0:
+        dtheta -= 2 * pi
+
+    r = max(rx, ry)
+    step = 2 * acos(1 - tolerance / r) if tolerance < r else pi / 2
+    n = max(1, ceil(abs(dtheta) / step))
+    thetas = theta + dtheta * np.linspace(0, 1, n + 1)[1:]
+    ex = rx * np.cos(thetas)
+    ey = ry * np.sin(thetas)
+    verts = np.column_stack([c * ex - s * ey + cx, s * ex + c * ey + cy])
+    verts[-1] = end
+    return verts
+
+
+def parse_path(path_str, tolerance=CURVE_TOLERANCE):
+    """Parse SVG path data into a list of subpaths.
+
+    Each subpath is an array of (x, y) vertices. Closing a subpath does
+    not repeat its first vertex.
+
+    """
+    subpaths = []
+    segments = []  # arrays of vertices in the current subpath
+    pos = np.zeros(2)
+    start = np.zeros(2)
+    ctrl = None  # the last control point of the previous curve
+    prev = None  # the previous command, in lower case
+
+    def finish():
+        if segments:
+            subpaths.append(np.concatenate(segments))
+            segments.clear()
+
+    def add(verts):
+        nonlocal pos
+        if not segments:
+            # Drawing after a closepath starts from the subpath's start
+            segments.append(pos[np.newaxis])
+        segments.append(verts)
+        pos = verts[-1] if len(verts) else pos
+
+    end = 0
+    for mo in PATH_COMMAND.finditer(path_str):
+        if path_str[end:mo.start()].strip():
+            raise ValueError(
+                f"Unexpected {path_str[end:mo.start()]!r} in {path_str!r}"
+            )
+        end = mo.end()
+
+        cmd, args = mo.groups()
+        op = cmd.lower()
+        relative = cmd.islower()
+        nums = parse_args(cmd, args, path_str)
+
+        if op == 'z':
+            finish()
+            pos = start
+            ctrl = None
+        elif op in 'ml':
+            verts = nums
+            if relative:
+                verts = np.cumsum(nums, axis=0) + pos
+            if op == 'm':
+                finish()
+                start = verts[0]
+                segments.append(verts)
+                pos = verts[-1]
+            else:
+                add(verts)
+        elif op == 'h':
+            xs = nums[:, 0]
+            if relative:
+                xs = np.cumsum(xs) + pos[0]
+            add(np.column_stack([xs, np.full(len(xs), pos[1])]))
+        elif op == 'v':
+            ys = nums[:, 0]
+            if relative:
+                ys = np.cumsum(ys) + pos[1]
+            add(np.column_stack([np.full(len(ys), pos[0]), ys]))
+        elif op == 'a':
+            for rx, ry, angle, large_arc, sweep, x, y in nums:
+                p = np.array([x, y]) + (pos if relative else 0)
+                add(flatten_arc(
+                    pos, rx, ry, angle, large_arc, sweep, p, tolerance
+                ))
+        else:
+            # Bézier curves; smooth curves reflect the previous control
+            # point, if the previous command was the same kind of curve
+            cubic = op in 'cs'
+            for row in nums:
+                points = row.reshape(-1, 2) + (pos if relative else 0)
+                if op in 'st':
+                    if prev in (('c', 's') if cubic else ('q', 't')):
+                        reflected = 2 * pos - ctrl
+                    else:
+                        reflected = pos
+                    points = np.vstack([reflected, points])
+                ctrl = points[-2]
+                add(flatten_bezier(np.vstack([pos, points]), tolerance))
+                prev = op
+        prev = op
+
+    if path_str[end:].strip():
+        raise ValueError(f"Unexpected {path_str[end:]!r} in {path_str!r}")
+    finish()
+    return subpaths
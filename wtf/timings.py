@@ -0,0 +1,104 @@
+"""Timing of the phases of each frame.
+
+Every phase of every frame is timed, whether or not the overlay is shown,
+so that when a frame hitches the overlay can tell which phase caused it.
+
+"""
+from time import perf_counter_ns
+from contextlib import contextmanager
+
+import numpy as np
+import pyglet.text
+
+
+class FrameTimer:
+    """Record how long each phase of a frame takes.
+
+    The times of the last `frames` frames are kept in a ring buffer, in
+    nanoseconds, with one column per phase.
+
+    """
+    def __init__(self, phases, frames=600):
+        self.phases = list(phases)
+        self.columns = {p: i for i, p in enumerate(self.phases)}
+        self.times = np.zeros((frames, len(self.phases)), dtype=np.int64)
+        self.current = np.zeros(len(self.phases), dtype=np.int64)
+        self.frames = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of the with block as part of the named phase."""
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.current[self.columns[name]] += perf_counter_ns() - start
+
+    def end_frame(self):
+        """Record the current frame and begin the next."""
+        self.times[self.frames % len(self.times)] = self.current
+        self.current[:] = 0
+        self.frames += 1
+
+    def stats(self):
+        """Return timing statistics for each phase, and the whole frame.
+
+        Each row is (name, p50, p95, p99, worst), in milliseconds.
+
+        """
+        times = self.times[:min(self.frames, len(self.times))]
+        if not len(times):
+            return []
+        times = np.column_stack([times, times.sum(axis=1)]) * 1e-6
+        pcts = np.percentile(times, [50, 95, 99], axis=0)
+        worst = times.max(axis=0)
+        return [
+            (name, *pcts[:, i], worst[i])
+            for i, name in enumerate(self.phases + ['frame'])
+        ]
+
+
+class TimingOverlay:
+    """An overlay showing the frame timing statistics.
+
+    The text is only updated every `interval` seconds, because laying it
+    out is slow enough to show up in the timings itself.
+
+    """
+    def __init__(self, timer, interval=0.5):
+        self.timer = timer
+        self.interval = interval
+        self.visible = False
+        self.t = 0
+        self.label = pyglet.text.Label(
+            '',
+            font_name='Courier New',
+            font_size=10,
+            x=10,
+            y=10,
+            width=420,
+            multiline=True,
+            anchor_y='bottom',
+            color=(255, 255, 255, 220),
+        )
+
+    def toggle(self):
+        """Show or hide the overlay."""
+        self.visible = not self.visible
+        self.t = self.interval
+
+    def update(self, dt):
+        if not self.visible:
+            return
+        self.t += dt
+        if self.t < self.interval:
+            return
+        self.t = 0
+        lines = [f"{'ms':<14}{'p50':>7}{'p95':>7}{'p99':>7}{'worst':>7}"]
+        for name, *values in self.timer.stats():
+            lines.append(f"{name:<14}" + ''.join(f'{v:7.2f}' for v in values))
+        self.label.text = '\n'.join(lines)
+
+    def draw(self):
+        if self.visible:
+            self.label.draw()
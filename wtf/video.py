@@ -0,0 +1,121 @@
+"""Capture every frame drawn to a framebuffer as video.
+
+Frames are read back through a ring of buffers: each frame is copied into
+the next buffer in the ring, and the buffer is only read once the ring has
+come round to it again, by which time the copy has long finished. The
+pixels are then encoded on a worker thread, either by piping them to
+ffmpeg or by writing a sequence of PNGs, so that the game keeps its frame
+rate while recording.
+
+"""
+import subprocess
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame.image
+import pygame.transform
+
+
+# Number of buffers in the readback ring
+RING_SIZE = 3
+
+# Number of frames that may wait to be encoded before capture blocks
+MAX_PENDING = 30
+
+
+class VideoWriter:
+    """Encode frames of RGB pixels, read bottom up from GL, on a thread.
+
+    If path has a suffix, such as .mp4, the frames are piped to ffmpeg;
+    otherwise path is a directory to write numbered PNGs into.
+
+    """
+    def __init__(self, path, size, fps=60):
+        self.path = Path(path)
+        self.size = size
+        self.frames = 0
+        self.pending = deque()
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        if self.path.suffix:
+            w, h = size
+            self.ffmpeg = subprocess.Popen(
+                [
+                    'ffmpeg', '-y', '-loglevel', 'error',
+                    '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                    '-s', f'{w}x{h}', '-r', str(fps), '-i', '-',
+                    '-vf', 'vflip', '-pix_fmt', 'yuv420p',
+                    str(self.path),
+                ],
+                stdin=subprocess.PIPE,
+            )
+        else:
+            self.ffmpeg = None
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    def write(self, pixels):
+        """Queue a frame to be encoded.
+
+        This blocks if MAX_PENDING frames are already waiting, so that a
+        slow encoder slows the game down rather than dropping frames.
+
+        """
+        while len(self.pending) >= MAX_PENDING:
+            self.pending.popleft().result()
+        self.pending.append(
+            self.worker.submit(self.encode, pixels, self.frames)
+        )
+        self.frames += 1
+
+    def encode(self, pixels, frame):
+        if self.ffmpeg:
+            self.ffmpeg.stdin.write(pixels)
+            return
+        image = pygame.image.frombuffer(pixels, self.size, 'RGB')
+        image = pygame.transform.flip(image, False, True)
+        pygame.image.save(image, str(self.path / f'frame{frame:06d}.png'))
+
+    def close(self):
+        """Finish encoding the frames written so far."""
+        self.worker.shutdown()
+        for future in self.pending:
+            future.result()
+        self.pending.clear()
+        if self.ffmpeg:
+            self.ffmpeg.stdin.close()
+            self.ffmpeg.wait()
+
+
+class VideoCapture:
+    """Capture each frame drawn to a framebuffer into a VideoWriter."""
+
+    def __init__(self, mgl, fbo, size, writer):
+        self.fbo = fbo
+        self.size = size
+        self.writer = writer
+        nbytes = size[0] * size[1] * 3
+        self.ring = [mgl.buffer(reserve=nbytes) for _ in range(RING_SIZE)]
+        self.filled = [False] * RING_SIZE
+        self.frame = 0
+
+    def end_frame(self):
+        """Capture the frame that has just been drawn."""
+        i = self.frame % RING_SIZE
+        if self.filled[i]:
+            self.writer.write(self.ring[i].read())
+        self.fbo.read_into(
+            self.ring[i], viewport=(0, 0, *self.size), components=3
+        )
+        self.filled[i] = True
+        self.frame += 1
+
+    def close(self):
+        """Write out the frames still in the ring, and finish encoding."""
+        for n in range(RING_SIZE):
+            i = (self.frame + n) % RING_SIZE
+            if self.filled[i]:
+                self.writer.write(self.ring[i].read())
+                self.filled[i] = False
+        for buf in self.ring:
+            buf.release()
+        self.writer.close()
@@ -1,11 +1,13 @@
-from math import copysign
-
 import numpy as np
 import moderngl
+from pymunk import Body
 
-from .physics import space, box, BUOYANCY, WATER_DRAG, COLLISION_TYPE_WATER
+from .physics import (
+    space, box, collision_handlers, BUOYANCY, WATER_DRAG, COLLISION_TYPE_WATER
+)
 from .state import UnderwaterState
 from . import sounds
+from .water_gpu import GPURipples
 
 
 class WaterBatch:
@@ -81,32 +83,50 @@ class WaterBatch:
         self.t_uniform = self.water_shader.get('t', None)
         self.tex_uniform = self.water_shader.get('diffuse', None)
 
+    def reserve(self, size):
+        """Replace the vertex buffer with one of at least size bytes.
+
+        The buffer only ever grows, so that it is reallocated rarely.
+
+        """
+        size = max(size, self.water_verts.size * 2)
+        self.water_vao.release()
+        self.water_verts.release()
+        self.water_verts = self.mgl.buffer(reserve=size, dynamic=True)
+        self.water_vao = self.mgl.simple_vertex_array(
+            self.water_shader,
+            self.water_verts,
+            'vert',
+            'depth',
+        )
+
     def render(self, dt, mvp):
         if not Water.insts:
             return
         self.t += dt
-        all_water = np.concatenate([w.vertices for w in Water.insts])
-        depths = np.stack([
-            np.zeros(len(all_water) // 2),
-            all_water[::2, 1] - all_water[1::2, 1]
-        ], axis=1).reshape((-1, 1))
-        all_water = np.concatenate([all_water, depths], axis=1)
-        all_water = all_water.reshape(-1).astype('f4').tobytes()
-
-        if self.water_verts.size != len(all_water):
-            self.water_verts = self.mgl.buffer(all_water, dynamic=True)
-            self.water_vao = self.mgl.simple_vertex_array(
-                self.water_shader,
-                self.water_verts,
-                'vert',
-                'depth',
-            )
-        else:
-            self.water_verts.write(all_water)
+
+        verts = Water.vertices
+        if verts.nbytes > self.water_verts.size:
+            self.reserve(verts.nbytes)
+            for w in Water.insts:
+                w.redraw = True
+        for w in Water.insts:
+            if w.redraw:
+                first = w.vert_first
+                self.water_verts.write(
+                    verts[first:first + w.vert_count],
+                    offset=first * verts.itemsize * 3,
+                )
+                w.redraw = False
 
         self.mvp_uniform.write(mvp.tobytes())
         self.t_uniform.value = self.t
-        self.water_vao.render(moderngl.TRIANGLE_STRIP)
+        for w in Water.insts:
+            self.water_vao.render(
+                moderngl.TRIANGLE_STRIP,
+                vertices=w.vert_count,
+                first=w.vert_first,
+            )
 
 
 class Water:
@@ -115,18 +135,57 @@ class Water:
     Each water body has a ripple system that creates waves that move along
     the surface. Water bodies are rendered with refraction and reflection.
 
+    The surfaces of all water bodies are stored end to end in shared arrays,
+    separated by PAD samples that are held at zero, so that the ripples of
+    every body can be stepped with a single convolution.
+
+    Bodies whose ripples have died away go to sleep: they are held exactly
+    still, and are neither simulated nor re-uploaded until an impulse or a
+    drip wakes them.
+
     """
     VCONV = np.array([0.05, 0.3, -0.8, 0.3, 0.05])
     LCONV = np.array([0.05, 0.9, 0.05])
 
     SUBDIV = 5
 
+    # Samples between water bodies; at least half the widest kernel
+    PAD = len(VCONV) // 2
+
+    # Bodies with less ripple energy than this (the sum of squared levels
+    # and velocities) go to sleep
+    SLEEP_ENERGY = 1e-5
+
+    # Smaller impulses than this don't wake a sleeping body
+    WAKE_IMPULSE = 1e-4
+
+    # With fewer bodies in the water than this, buoyancy is applied to each
+    # in turn, which is quicker than setting up the vectorized pass
+    VECTORIZE_CONTACTS = 4
+
     insts = []
 
+    # Shared surface state of all water bodies
+    all_levels = np.zeros(PAD)
+    all_velocities = np.zeros(PAD)
+    mask = np.zeros(PAD)  # 1.0 for surface samples, 0.0 for padding
+    surface = np.zeros(0, dtype=int)  # indices of the surface samples
+
+    # Shapes touching each water shape, as (water shape, shape) keys
+    contacts = {}
+
+    # The GPU ripple solver, if enabled (see wtf.water_gpu)
+    gpu = None
+
+    # Interleaved (x, y, depth) triangle strip vertices for all bodies, in
+    # the layout of WaterBatch's vertex buffer. This is updated in place.
+    vertices = np.zeros((0, 3), dtype='f4')
+
     def __init__(self, surf_y, x1, x2, bot_y=0):
         self.y = surf_y
         self.x1 = x1
         self.x2 = x2
+        self.bot_y = bot_y
 
         self.shape = box(
             space.static_body,
@@ -137,87 +196,359 @@ class Water:
         )
         self.shape.water = self
         self.shape.collision_type = COLLISION_TYPE_WATER
+        self.shape.sensor = True
         space.add(self.shape)
 
-        size = int(x2 - x1) * self.SUBDIV + 1
-        self.xs = np.linspace(x1, x2, size)
-        self.velocities = np.zeros(size)
-        self.levels = np.zeros(size)
-        self.bot_verts = np.ones(size) * bot_y
+        self.size = int(x2 - x1) * self.SUBDIV + 1
+        self.xs = np.linspace(x1, x2, self.size)
+        self.start = self.end = None
+        self.awake = False
+        self.waking = False  # woken since the GPU state was last read back
+        self.redraw = True  # whether the vertices need uploading
         self.insts.append(self)
+        self.repack()
+
+    @property
+    def levels(self):
+        """The surface levels of this water body, as a view."""
+        return Water.all_levels[self.start:self.end]
+
+    @property
+    def velocities(self):
+        """The surface velocities of this water body, as a view."""
+        return Water.all_velocities[self.start:self.end]
+
+    @classmethod
+    def repack(cls):
+        """Lay out the surfaces of all water bodies in the shared arrays.
+
+        Existing ripples are preserved.
+
+        """
+        pad = cls.PAD
+        size = pad + sum(w.size + pad for w in cls.insts)
+        levels = np.zeros(size)
+        velocities = np.zeros(size)
+        mask = np.zeros(size)
+
+        start = pad
+        first = 0
+        for w in cls.insts:
+            end = start + w.size
+            if w.start is not None:
+                levels[start:end] = w.levels
+                velocities[start:end] = w.velocities
+            w.start, w.end = start, end
+            w.redraw = True
+            mask[start:end] = 1.0
+            start = end + pad
+
+            # Each body is drawn as a separate range of the strip
+            w.vert_first = first
+            w.vert_count = w.size * 2
+            first += w.vert_count
+
+        cls.all_levels = levels
+        cls.all_velocities = velocities
+        cls.mask = mask
+        cls.surface = np.flatnonzero(mask)
+
+        # Scratch space for the surface heights
+        cls.tops = np.zeros(len(cls.surface))
+
+        # The vertex columns that don't change can be filled in now; the
+        # surface vertices alternate with the vertices at the bottom
+        verts = cls.vertices = np.zeros((len(cls.surface) * 2, 3), 'f4')
+        if cls.insts:
+            xs = np.concatenate([w.xs for w in cls.insts])
+            cls.surf_ys = np.concatenate(
+                [np.full(w.size, w.y) for w in cls.insts]
+            )
+            cls.bot_ys = np.concatenate(
+                [np.full(w.size, w.bot_y) for w in cls.insts]
+            )
+            verts[0::2, 0] = verts[1::2, 0] = xs
+            verts[1::2, 1] = cls.bot_ys
+        cls.update_all_vertices()
+        if cls.gpu:
+            cls.gpu.resize()
+
+    @classmethod
+    def use_gpu(cls, mgl):
+        """Step the ripples on the GPU, if the context supports it.
 
-    def update(self, dt):
-        self.velocities += np.convolve(
-            self.levels,
-            self.VCONV * (dt * 60),
+        Return True if the GPU solver is now in use.
+
+        """
+        if not GPURipples.supported(mgl):
+            return False
+        cls.gpu = GPURipples(mgl, cls)
+        cls.gpu.resize()
+        return True
+
+    @classmethod
+    def reset_all(cls):
+        """Flatten the surfaces of all water bodies."""
+        for w in cls.insts:
+            w.sleep()
+
+    @classmethod
+    def update_all(cls, dt):
+        """Step the ripples of all water bodies."""
+        awake = [w for w in cls.insts if w.awake]
+        if not awake:
+            return
+        if cls.gpu:
+            cls.gpu.step(dt)
+        else:
+            for a, b in cls.awake_runs():
+                cls.step_ripples(dt, a - cls.PAD, b + cls.PAD)
+        for w in awake:
+            w.update_vertices()
+            if w.waking:
+                # The impulse that woke it isn't in the state read back yet
+                w.waking = False
+                continue
+            levels = w.levels
+            velocities = w.velocities
+            energy = levels @ levels + velocities @ velocities
+            if energy < cls.SLEEP_ENERGY:
+                w.sleep()
+
+    @classmethod
+    def awake_runs(cls):
+        """Iterate over the (start, end) sample ranges of awake bodies.
+
+        Consecutive awake bodies are merged into one range, so that they can
+        be stepped together.
+
+        """
+        run = None
+        for w in cls.insts:
+            if not w.awake:
+                if run:
+                    yield run
+                run = None
+            elif run:
+                run = run[0], w.end
+            else:
+                run = w.start, w.end
+        if run:
+            yield run
+
+    @classmethod
+    def step_ripples(cls, dt, a, b):
+        """Step the ripples of samples [a, b) on the CPU.
+
+        The range must begin and end with padding.
+
+        """
+        levels = cls.all_levels[a:b]
+        velocities = cls.all_velocities[a:b]
+        mask = cls.mask[a:b]
+        velocities += np.convolve(
+            levels,
+            cls.VCONV * (dt * 60),
             'same',
         )
-        self.velocities *= 0.5 ** dt  # damp
-        self.levels = np.convolve(
-            self.levels,
-            self.LCONV,
+        velocities *= 0.5 ** dt  # damp
+        levels[:] = np.convolve(
+            levels,
+            cls.LCONV,
             'same'
-        ) + self.velocities * 10 * dt  # apply velocity
+        ) + velocities * 10 * dt  # apply velocity
+
+        # Hold the padding still so that bodies don't affect each other
+        levels *= mask
+        velocities *= mask
 
-        verts = np.dstack((
-            self.xs,
-            self.levels + self.y,
-            self.xs,
-            self.bot_verts,
-        ))
-        self.vertices = verts.reshape((-1, 2))
+    @classmethod
+    def update_all_vertices(cls):
+        """Update the surface vertices of all water bodies, in place.
+
+        The depth of each bottom vertex is its distance below the surface.
+
+        """
+        if not cls.insts:
+            return
+        tops = cls.tops
+        np.take(cls.all_levels, cls.surface, out=tops)
+        tops += cls.surf_ys
+        verts = cls.vertices
+        verts[0::2, 1] = tops
+        np.subtract(tops, cls.bot_ys, out=verts[1::2, 2])
+
+    def update_vertices(self):
+        """Update the surface vertices of this water body, in place."""
+        first = self.vert_first // 2
+        last = first + self.size
+        tops = Water.tops[first:last]
+        np.add(self.levels, Water.surf_ys[first:last], out=tops)
+        verts = Water.vertices[
+            self.vert_first:self.vert_first + self.vert_count
+        ]
+        verts[0::2, 1] = tops
+        np.subtract(tops, Water.bot_ys[first:last], out=verts[1::2, 2])
+        self.redraw = True
+
+    def sleep(self):
+        """Stop simulating this body, holding its surface perfectly flat."""
+        self.awake = False
+        self.levels[:] = 0
+        self.velocities[:] = 0
+        if Water.gpu:
+            Water.gpu.upload(self.start, self.end)
+        self.update_vertices()
+
+    def impulse(self, a, b, damp, dv):
+        """Damp the surface velocity of samples [a, b) and add dv."""
+        if not self.awake:
+            if abs(dv) < self.WAKE_IMPULSE:
+                return
+            self.awake = True
+            self.waking = Water.gpu is not None
+        if Water.gpu:
+            Water.gpu.impulse(self.start + a, self.start + b, damp, dv)
+        else:
+            v = self.velocities[a:b]
+            v *= damp
+            v += dv
 
     def drip(self, _):
-        self.levels[-9] = -0.5
-        self.velocities[-9] = 0
+        self.awake = True
+        if Water.gpu:
+            Water.gpu.poke(self.end - 9, -0.5, 0)
+        else:
+            self.levels[-9] = -0.5
+            self.velocities[-9] = 0
 
     def delete(self):
         space.remove(self.shape)
+        for key in [k for k in Water.contacts if k[0] is self.shape]:
+            del Water.contacts[key]
         self.insts.remove(self)
+        self.repack()
 
-    def pre_solve(arbiter, space, data):
-        dt = space.current_time_step
-        water, actor = arbiter.shapes
-        body = actor.body
-        if not body:
-            return False
-
-        inst = water.water
+    @classmethod
+    def apply_buoyancy(cls, dt):
+        """Apply buoyancy and drag to every body in the water.
 
-        bb = actor.cache_bb()
+        This should be called before each physics step. The immersion of all
+        bodies is computed in one pass over the surface samples beneath
+        them; bodies at the surface also disturb it.
 
-        a = round((bb.left - inst.x1) * inst.SUBDIV)
-        b = round((bb.right - inst.x1) * inst.SUBDIV)
-        a = max(0, a)
-        b = min(b, len(inst.levels))
+        """
+        if not cls.contacts:
+            return
+        # Take the contacts in order of position, so that their impulses sum
+        # in the same order however the contacts began
+        contacts = sorted(
+            (
+                (water.water, shape.body, shape.cache_bb())
+                for water, shape in cls.contacts
+            ),
+            key=lambda c: (c[0].start, c[2].left, c[2].bottom)
+        )
+        if len(contacts) < cls.VECTORIZE_CONTACTS:
+            for water, body, bb in contacts:
+                water.buoy(body, bb, dt)
+            return
 
-        levels = inst.levels[a:b] + inst.y
-        frac_immersed = float(np.mean(np.clip(
-            (levels - bb.bottom) / (bb.top - bb.bottom),
+        waters, bodies, bbs = zip(*contacts)
+        bbs = np.array([
+            (bb.left, bb.bottom, bb.right, bb.top) for bb in bbs
+        ])
+        left, bottom, right, top = bbs.T
+        x1, y, start, size = np.array(
+            [(w.x1, w.y, w.start, w.size) for w in waters]
+        ).T
+        start = start.astype(int)
+        size = size.astype(int)
+
+        # The range of surface samples [a, b) beneath each body
+        a = np.rint((left - x1) * cls.SUBDIV).astype(int)
+        b = np.rint((right - x1) * cls.SUBDIV).astype(int)
+        a = np.clip(a, 0, size - 1)
+        b = np.clip(b, a + 1, size)
+        n = b - a
+
+        # Gather the samples of all ranges end to end
+        first = np.cumsum(n) - n
+        idx = np.arange(n.sum()) + np.repeat(start + a - first, n)
+        levels = cls.all_levels[idx] + np.repeat(y, n)
+        immersion = np.clip(
+            (levels - np.repeat(bottom, n)) / np.repeat(top - bottom, n),
             0, 1
-        )))
+        )
+        frac_immersed = np.add.reduceat(immersion, first) / n
+
+        velocity = np.array([tuple(body.velocity) for body in bodies])
+        buoyancy = np.outer((right - left) * (top - bottom), tuple(BUOYANCY))
+        for i, body in enumerate(bodies):
+            custom = getattr(body, 'buoyancy', None)
+            if custom:
+                buoyancy[i] = custom
+        drag = -velocity * WATER_DRAG
+
+        # Both buoyancy and drag are scaled by how immersed we are
+        forces = (buoyancy + drag) * frac_immersed[:, np.newaxis]
+
+        f = 0.6 ** dt
+        vy = np.clip(velocity[:, 1], -100, 100)
+        dv = vy * np.abs(vy) * 40 * (1.0 - f) / n * dt
+
+        at_surface = frac_immersed < 1
+        for inst, body, force, surf, ia, ib, idv in zip(
+            waters, bodies, forces.tolist(), at_surface.tolist(),
+            a.tolist(), b.tolist(), dv.tolist()
+        ):
+            if surf:
+                inst.impulse(ia, ib, f, idv)
+                body.underwater = UnderwaterState.SURFACE
+            else:
+                body.underwater = UnderwaterState.UNDERWATER
+            body.apply_force_at_local_point(force, body.center_of_gravity)
+
+    def buoy(self, body, bb, dt):
+        """Apply buoyancy and drag to one body, with bounding box bb.
+
+        This is the same calculation as apply_buoyancy, for a single body.
+
+        """
+        a = round((bb.left - self.x1) * self.SUBDIV)
+        b = round((bb.right - self.x1) * self.SUBDIV)
+        a = min(max(a, 0), self.size - 1)
+        b = min(max(b, a + 1), self.size)
+        n = b - a
+
+        levels = self.levels[a:b] + self.y
+        height = bb.top - bb.bottom
+        immersion = np.clip((levels - bb.bottom) / height, 0, 1)
+        # Summed just as apply_buoyancy sums the ranges of all bodies, so
+        # that both give exactly the same result
+        frac_immersed = float(np.add.reduceat(immersion, [0])[0]) / n
+
+        velocity = body.velocity
         if frac_immersed < 1:
             f = 0.6 ** dt
-            vy = body.velocity.y
-            vy = copysign(min(100, abs(vy)), vy)
-            inst.velocities[a:b] = (
-                inst.velocities[a:b] * f +
-                vy * abs(vy) * 40 * (1.0 - f) / (b - a) * dt
-            )
+            vy = max(-100, min(100, velocity.y))
+            self.impulse(a, b, f, vy * abs(vy) * 40 * (1.0 - f) / n * dt)
             body.underwater = UnderwaterState.SURFACE
         else:
             body.underwater = UnderwaterState.UNDERWATER
 
-        buoyancy = getattr(body, 'buoyancy', None) or BUOYANCY * bb.area()
-        drag = -body.velocity * WATER_DRAG
+        buoyancy = getattr(body, 'buoyancy', None)
+        if not buoyancy:
+            buoyancy = BUOYANCY * ((bb.right - bb.left) * height)
+        drag = -velocity * WATER_DRAG
 
         # Both buoyancy and drag are scaled by how immersed we are
         force = (buoyancy + drag) * frac_immersed
         body.apply_force_at_local_point(force, body.center_of_gravity)
-        return False
 
     def separate(arbiter, space, data):
         water, actor = arbiter.shapes
+        Water.contacts.pop((water, actor), None)
         body = actor.body
         if not body:
             return False
@@ -225,7 +556,8 @@ class Water:
 
     def begin(arbiter, space, data):
         water, other = arbiter.shapes
-        if other.body:
+        if other.body and other.body.body_type == Body.DYNAMIC:
+            Water.contacts[water, other] = None
             speed = other.body.velocity.length
             if speed > 20:
                 sounds.play('splash1')
@@ -233,7 +565,9 @@ class Water:
                 sounds.play('splash1', volume=(speed - 10) / 10)
         return True
 
+
+@collision_handlers
+def add_water_handlers():
     handler = space.add_wildcard_collision_handler(COLLISION_TYPE_WATER)
-    handler.begin = begin
-    handler.pre_solve = pre_solve
-    handler.separate = separate
+    handler.begin = Water.begin
+    handler.separate = Water.separate
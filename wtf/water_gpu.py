@@ -0,0 +1,244 @@
+"""Ripple simulation for water surfaces on the GPU.
+
+The surface levels and velocities of all water bodies are kept in a float
+texture and stepped with a transform feedback pass, which evaluates the
+same kernels as Water.step_ripples for every sample at once. Only the
+impulses that actors apply to the surface in Water.apply_buoyancy are
+uploaded each frame.
+
+The new levels are read back into Water.all_levels, because buoyancy is
+calculated on the CPU; velocities are read back too, so the CPU arrays
+mirror the GPU state. So that reading back never stalls for the GPU, each
+step writes its state into the next buffer in a ring, and the state is
+only read from a buffer the step after it was written, by which time the
+pass has long finished. The CPU arrays therefore lag one step behind the
+GPU.
+
+"""
+import numpy as np
+import moderngl
+
+
+# Number of buffers in the readback ring
+RING_SIZE = 2
+
+
+class GPURipples:
+    # Texture unit used to bind the state while stepping
+    TEXTURE_UNIT = 1
+
+    def __init__(self, mgl, water):
+        self.mgl = mgl
+        self.water = water
+        self.size = 0
+        self.buffers = []
+
+        vconv = ', '.join(repr(float(k)) for k in water.VCONV)
+        lconv = ', '.join(repr(float(k)) for k in water.LCONV)
+        self.program = mgl.program(
+            vertex_shader=f'''
+                #version 130
+
+                in float damping;
+                in float impulse;
+                in float mask;
+
+                uniform sampler2D state;  // (level, velocity) per sample
+                uniform float dt;
+
+                const float VCONV[{len(water.VCONV)}] = float[]({vconv});
+                const float LCONV[{len(water.LCONV)}] = float[]({lconv});
+
+                out float out_level;
+                out float out_velocity;
+
+                float level(int i) {{
+                    return texelFetch(state, ivec2(i, 0), 0).r;
+                }}
+
+                void main() {{
+                    int i = gl_VertexID;
+                    gl_Position = vec4(0.0);  // unused; some drivers insist
+
+                    // Hold the padding still (and never read off the ends)
+                    if (mask == 0.0) {{
+                        out_level = 0.0;
+                        out_velocity = 0.0;
+                        return;
+                    }}
+
+                    float v = texelFetch(state, ivec2(i, 0), 0).g;
+                    v = v * damping + impulse;
+
+                    int vc = VCONV.length() / 2;
+                    float dv = 0.0;
+                    for (int k = 0; k < VCONV.length(); k++) {{
+                        dv += VCONV[k] * level(i + vc - k);
+                    }}
+                    v = (v + dv * dt * 60.0) * pow(0.5, dt);
+
+                    int lc = LCONV.length() / 2;
+                    float l = 0.0;
+                    for (int k = 0; k < LCONV.length(); k++) {{
+                        l += LCONV[k] * level(i + lc - k);
+                    }}
+
+                    out_level = l + v * 10.0 * dt;
+                    out_velocity = v;
+                }}
+            ''',
+            varyings=['out_level', 'out_velocity'],
+        )
+        self.dt_uniform = self.program['dt']
+        self.program['state'].value = self.TEXTURE_UNIT
+
+    @classmethod
+    def supported(cls, mgl):
+        """Return True if the context can run the GPU solver."""
+        return mgl.version_code >= 300
+
+    def release(self):
+        """Release the GL objects holding the state."""
+        for obj in self.buffers:
+            obj.release()
+        self.buffers = []
+
+    def resize(self):
+        """Reallocate the GPU state to match the layout of the water.
+
+        The state is uploaded from the CPU arrays, and any pending
+        impulses are discarded.
+
+        """
+        self.release()
+        water = self.water
+        self.size = size = len(water.all_levels)
+        if size > self.mgl.info['GL_MAX_TEXTURE_SIZE']:
+            raise ValueError(
+                f"Too many water samples ({size}) for the GPU solver"
+            )
+
+        self.damping = np.ones(size, dtype='f4')
+        self.impulses = np.zeros(size, dtype='f4')
+        self.dirty = None  # range of samples with pending impulses
+        self.uploaded = None  # range that must be reset on the GPU
+
+        self.readback = np.empty((size, 2), dtype='f4')
+        self.readback[:, 0] = water.all_levels
+        self.readback[:, 1] = water.all_velocities
+
+        self.state = self.mgl.texture((size, 1), 2, dtype='f4')
+        self.state.filter = moderngl.NEAREST, moderngl.NEAREST
+        self.state.write(self.readback)
+        self.ring = [
+            self.mgl.buffer(reserve=self.readback.nbytes)
+            for _ in range(RING_SIZE)
+        ]
+        # Ranges uploaded since each buffer in the ring was written
+        self.stale = [[] for _ in range(RING_SIZE)]
+        self.steps = 0
+
+        self.damping_buf = self.mgl.buffer(self.damping)
+        self.impulse_buf = self.mgl.buffer(self.impulses)
+        self.mask_buf = self.mgl.buffer(water.mask.astype('f4'))
+        self.vao = self.mgl.vertex_array(self.program, [
+            (self.damping_buf, 'f', 'damping'),
+            (self.impulse_buf, 'f', 'impulse'),
+            (self.mask_buf, 'f', 'mask'),
+        ])
+        self.buffers = [
+            self.vao,
+            self.state,
+            *self.ring,
+            self.damping_buf,
+            self.impulse_buf,
+            self.mask_buf,
+        ]
+
+    def impulse(self, a, b, damp, dv):
+        """Damp the velocity of samples [a, b) and add dv, at the next step.
+
+        Impulses compose in the order they are applied.
+
+        """
+        self.damping[a:b] *= damp
+        self.impulses[a:b] *= damp
+        self.impulses[a:b] += dv
+        self.dirty = union(self.dirty, (a, b))
+
+    def poke(self, i, level, velocity):
+        """Set the level and velocity of sample i immediately."""
+        self.water.all_levels[i] = level
+        self.water.all_velocities[i] = velocity
+        self.upload(i, i + 1)
+
+    def upload(self, a, b):
+        """Upload the CPU state of samples [a, b), replacing the GPU state.
+
+        Impulses queued for the range are dropped, since they were meant
+        for the state being replaced. The states waiting in the ring
+        predate the upload, so that range of them is ignored when they are
+        read back.
+
+        """
+        self.damping[a:b] = 1.0
+        self.impulses[a:b] = 0.0
+        state = self.readback[a:b]
+        state[:, 0] = self.water.all_levels[a:b]
+        state[:, 1] = self.water.all_velocities[a:b]
+        self.state.write(state, viewport=(a, 0, b - a, 1))
+        for stale in self.stale:
+            stale.append((a, b))
+
+    def upload_impulses(self):
+        """Upload the range of samples that have had impulses applied.
+
+        The range uploaded last time is uploaded again, having been reset,
+        so that those impulses are not applied twice.
+
+        """
+        upload = union(self.dirty, self.uploaded)
+        if upload:
+            a, b = upload
+            self.damping_buf.write(self.damping[a:b], offset=a * 4)
+            self.impulse_buf.write(self.impulses[a:b], offset=a * 4)
+        if self.dirty:
+            a, b = self.dirty
+            self.damping[a:b] = 1.0
+            self.impulses[a:b] = 0.0
+        self.uploaded = self.dirty
+        self.dirty = None
+
+    def step(self, dt):
+        """Step the ripples of all water bodies.
+
+        The CPU arrays are updated with the state of the previous step.
+
+        """
+        water = self.water
+        prev = (self.steps - 1) % RING_SIZE
+        if self.steps:
+            self.ring[prev].read_into(self.readback)
+            for a, b in self.stale[prev]:
+                self.readback[a:b, 0] = water.all_levels[a:b]
+                self.readback[a:b, 1] = water.all_velocities[a:b]
+            np.copyto(water.all_levels, self.readback[:, 0])
+            np.copyto(water.all_velocities, self.readback[:, 1])
+
+        i = self.steps % RING_SIZE
+        self.stale[i] = []
+        self.upload_impulses()
+        self.dt_uniform.value = dt
+        self.state.use(location=self.TEXTURE_UNIT)
+        self.vao.transform(self.ring[i], moderngl.POINTS, vertices=self.size)
+        self.state.write(self.ring[i])
+        self.steps += 1
+
+
+def union(r1, r2):
+    """Return the smallest range covering the ranges r1 and r2."""
+    if r1 is None:
+        return r2
+    if r2 is None:
+        return r1
+    return min(r1[0], r2[0]), max(r1[1], r2[1])